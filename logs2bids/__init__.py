@@ -0,0 +1,10 @@
+################################################################
+## logs2bids: BIDS events.tsv files from the carousel task logs
+##
+## One module per task (beliefs, emoinf, social, emomatch,
+## fixation, movie) with a convert() returning the events table.
+## Command line: python -m logs2bids (see README.md)
+################################################################
+
+from .log_reader import read_log_to_dataframe
+from .convert import TASKS, events_filename, convert_file
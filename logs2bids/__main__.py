@@ -0,0 +1,34 @@
+# python -m logs2bids <task> <log> <out> <subject> <session> --acq .. [--run ..] [--movie ..]
+# python -m logs2bids batch --acq .. [--logs ..] [--out ..] [--jobs ..]
+
+import sys
+import argparse
+from . import batch
+from .convert import TASKS, convert_file
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        return batch.main(argv[1:])
+    parser = argparse.ArgumentParser(prog='python -m logs2bids', description="Convert one task log to a BIDS events.tsv")
+    parser.add_argument('task', choices=list(TASKS))
+    parser.add_argument('infile', help="task .log or _events.jsonl (emomatch: the task .csv)")
+    parser.add_argument('outpath', help="the participant's rawdata/sub-XX/ses-YY/func directory")
+    parser.add_argument('subject', help="e.g. 001")
+    parser.add_argument('session', help="e.g. 01")
+    parser.add_argument('--acq', required=True, help="acquisition label, e.g. 1p9mm")
+    parser.add_argument('--run', help="run number (beliefs, emoinf, social, emomatch)")
+    parser.add_argument('--movie', help="movie name (movie task), e.g. lotr")
+    args = parser.parse_args(argv)
+    if TASKS[args.task][1] and args.run is None:
+        parser.error(f"{args.task} needs --run")
+    if args.task == 'movie' and not args.movie:
+        parser.error("movie needs --movie")
+    print(convert_file(args.task, args.infile, args.outpath, args.subject, args.session, args.acq,
+                       run=args.run, movie=args.movie))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
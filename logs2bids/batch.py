@@ -0,0 +1,166 @@
+################################################################
+## batch conversion of a whole logs directory
+##
+## Scans <logs>/<task>/ for the carousel's run files, e.g.
+##   sub-001_ses-01_task-beliefs_lang-en_run-2_2026.10.18_09.32.40.log
+##   sub-001_ses-01_rest-movie-lotr_lang-en_2026.10.18_09.32.40.log
+## and converts every run through a process pool into
+## <out>/sub-XXX/ses-YY/func/. A run is converted from its
+## _events.jsonl when there is one, else from its .log (emomatch:
+## from its .csv). Only the latest attempt of a run is converted,
+## and only if it is new or changed since the last batch (state.py).
+################################################################
+
+import os
+import re
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .convert import TASKS, events_filename, convert_file, io_root_dir
+from .state import load_state, save_state, plan, orphans
+
+RUN_FILE = re.compile(
+    r'^sub-(?P<subject>[^_]+)_ses-(?P<session>[^_]+)_'
+    r'(?:task-(?P<task>[^_]+)|rest-(?P<rest>fixation|movie-(?P<movie>[^_]+)))'
+    r'_lang-(?P<lang>[^_]+)(?:_run-(?P<run>[^_]+))?'
+    r'_(?P<datetime>\d{4}\.\d{2}\.\d{2}_\d{2}\.\d{2}\.\d{2})'
+    r'(?P<suffix>\.log|_events\.jsonl|\.csv|_ABORT\.csv)$')
+
+Run = namedtuple('Run', ['task', 'subject', 'session', 'run', 'movie', 'lang', 'datetime', 'infile'])
+
+
+def parse_name(filename):
+    """Run entities of a run file name (task is the converter module), or None."""
+    m = RUN_FILE.match(filename)
+    if m is None:
+        return None
+    entities = m.groupdict()
+    if entities['rest'] == 'fixation':
+        entities['task'] = 'fixation'
+    elif entities['rest']:
+        entities['task'] = 'movie'
+    return entities
+
+def scan(logs_dir):
+    """Latest attempt of every run below ``logs_dir``; returns (runs, [(path, reason), ...] skipped)."""
+    found, skipped = {}, []
+    for task_dir in sorted(os.scandir(logs_dir), key=lambda e: e.name):
+        if not task_dir.is_dir():
+            continue
+        for entry in sorted(os.scandir(task_dir.path), key=lambda e: e.name):
+            entities = parse_name(entry.name)
+            if entities is None:
+                continue  # backups, phases, pulses, timing, ...
+            key = (entities['task'], entities['subject'], entities['session'], entities['run'], entities['movie'])
+            attempt = found.setdefault(key, {}).setdefault(entities['datetime'], {'entities': entities, 'files': {}})
+            attempt['files'][entities['suffix']] = entry.path
+
+    runs = []
+    for key, attempts in sorted(found.items(), key=lambda kv: tuple(v or '' for v in kv[0])):
+        task = key[0]
+        latest = max(attempts)
+        for older in sorted(attempts)[:-1]:
+            files = attempts[older]['files']
+            skipped.append((files.get('.log', next(iter(files.values()))), f"superseded by the {latest} attempt"))
+        entities, files = attempts[latest]['entities'], attempts[latest]['files']
+        any_file = next(iter(files.values()))
+        if task not in TASKS:
+            skipped.append((any_file, f"no converter for task {task}"))
+            continue
+        if '_ABORT.csv' in files:
+            skipped.append((files['_ABORT.csv'], "run was aborted"))
+            continue
+        infile = files.get('.csv') if task == 'emomatch' else files.get('_events.jsonl', files.get('.log'))
+        if infile is None:
+            skipped.append((any_file, "no " + ("csv" if task == 'emomatch' else "log") + " for this run"))
+            continue
+        runs.append(Run(task, entities['subject'], entities['session'], entities['run'], entities['movie'],
+                        entities['lang'], entities['datetime'], infile))
+    return runs, skipped
+
+def func_dir(out_root, run):
+    return os.path.join(out_root, 'sub-' + run.subject, 'ses-' + run.session, 'func')
+
+def output_path(out_root, run, acq):
+    bids_task, has_run = TASKS[run.task]
+    return os.path.join(func_dir(out_root, run),
+                        events_filename(run.subject, run.session, bids_task or run.movie, acq, run.run if has_run else None))
+
+def convert_run(run, out_root, acq):
+    """Worker: convert one run; returns (run, None) or (run, error message)."""
+    try:
+        convert_file(run.task, run.infile, func_dir(out_root, run), run.subject, run.session, acq,
+                     run=run.run, movie=run.movie)
+    except Exception as e:
+        return run, f"{type(e).__name__}: {e}"
+    return run, None
+
+def convert_all(runs, out_root, acq, jobs=None):
+    """Convert ``runs`` on ``jobs`` processes (1: in this process); returns [(run, error or None), ...]."""
+    for run in runs:
+        os.makedirs(func_dir(out_root, run), exist_ok=True)
+    if jobs == 1 or len(runs) <= 1:
+        return [convert_run(run, out_root, acq) for run in runs]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(convert_run, runs, [out_root] * len(runs), [acq] * len(runs)))
+
+def main(argv=None):
+    io_root = io_root_dir()
+    parser = argparse.ArgumentParser(prog='python -m logs2bids batch', description="Convert every run in a logs directory")
+    parser.add_argument('--logs', default=io_root and os.path.join(io_root, 'logs'),
+                        help="logs directory with one folder per task (default: io_root_dir/logs of config.json)")
+    parser.add_argument('--out', default=io_root and os.path.join(io_root, 'rawdata'),
+                        help="BIDS rawdata directory (default: io_root_dir/rawdata)")
+    parser.add_argument('--acq', required=True, help="acquisition label, e.g. 1p9mm")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', help="convert every run, also those that are up to date")
+    parser.add_argument('--prune', action='store_true', help="delete events files whose source log is gone")
+    parser.add_argument('--dry-run', action='store_true', help="list what would be converted")
+    args = parser.parse_args(argv)
+    if not args.logs or not os.path.isdir(args.logs):
+        parser.error(f"logs directory not found: {args.logs}")
+    if not args.out:
+        parser.error("no --out given and no io_root_dir in config.json")
+    out_root = os.path.abspath(args.out)
+
+    runs, skipped = scan(args.logs)
+    state = load_state(out_root)
+    outputs = [os.path.relpath(output_path(out_root, run, args.acq), out_root) for run in runs]
+    todo, current, entries = plan([(run.task, os.path.abspath(run.infile), rel) for run, rel in zip(runs, outputs)],
+                                  out_root, state, force=args.force)
+    todo = set(todo)
+    to_convert = [run for run, rel in zip(runs, outputs) if rel in todo]
+    if args.dry_run:
+        for run in to_convert:
+            print(f"{run.infile} -> {output_path(out_root, run, args.acq)}")
+        results = []
+    else:
+        results = convert_all(to_convert, out_root, args.acq, args.jobs)
+        done = {run: error for run, error in results}
+        for run, rel in zip(runs, outputs):
+            if rel not in todo or done.get(run, '') is None:
+                state[rel] = entries[rel]
+            else:
+                state.pop(rel, None)  # failed: converted again next time
+
+    failed = [(run, error) for run, error in results if error]
+    for path, reason in skipped:
+        print(f"skipped  {os.path.basename(path)}: {reason}")
+    for run, error in failed:
+        print(f"FAILED   {os.path.basename(run.infile)}: {error}")
+    orphaned = orphans(state)
+    for rel in orphaned:
+        print(f"orphaned {rel}: {state[rel]['input']} is gone" + (", removed" if args.prune and not args.dry_run else ""))
+        if args.prune and not args.dry_run:
+            try:
+                os.remove(os.path.join(out_root, rel))
+            except FileNotFoundError:
+                pass
+            del state[rel]
+    if not args.dry_run and os.path.isdir(out_root):
+        save_state(out_root, state)
+    print(f"{len(results) - len(failed)} converted, {len(failed)} failed, {len(current)} up to date, "
+          f"{len(skipped)} skipped, {len(orphaned)} orphaned"
+          + (f" ({len(to_convert)} to convert)" if args.dry_run else f" -> {out_root}"))
+    return 1 if failed else 0
@@ -0,0 +1,145 @@
+################################################################
+## benchmark of the response extraction on synthetic logs
+##
+## Writes a social-task log with many trials (random key presses
+## in every screen, some response screens without any, scanner
+## pulses as "Keypress: 5"), checks that first_keypress_per_display
+## returns exactly what the former per-group loop returned, and
+## times both, and the whole text-path conversion. The same run is
+## also written as an _events.jsonl; both paths must give the same
+## responses, and a missed response (-1) must score 0 on both:
+##
+##   python -m logs2bids.benchmark --trials 10000
+################################################################
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+from .log_reader import read_log_to_dataframe, first_keypress_per_display
+from . import social
+
+
+def first_keypress_loop(df_response, display_mask):
+    """The per-group loop the converters used before (reference for the check)."""
+    group_ids = display_mask.cumsum()
+    df_with_groups = df_response.copy()
+    df_with_groups['group_id'] = group_ids
+    result_rows = []
+    for group_id, group_df in df_with_groups.groupby('group_id'):
+        display_row = group_df[display_mask[group_df.index]]
+        keypress_rows = group_df[group_df['event_details'].str.startswith('Keypress:')]
+        if not keypress_rows.empty:
+            group_result = pd.concat([display_row, keypress_rows.iloc[0:1]])
+        else:
+            keypress_tmp = display_row.copy()
+            keypress_tmp["event_type"] = "DATA"
+            keypress_tmp["event_details"] = "Keypress: -1"
+            group_result = pd.concat([display_row, keypress_tmp])
+        result_rows.append(group_result)
+    return pd.concat(result_rows).drop('group_id', axis=1)
+
+def synthetic_log(path, n_trials, seed=0, events_path=None):
+    """Social-task log of ``n_trials`` trials (fixation 12 s, clip 3 s, question 3 s).
+
+    With ``events_path`` the same run is also written as an event stream.
+    """
+    rng = np.random.default_rng(seed)
+    lines = ["0.0167 \tEXP \tDISPLAY instructions", "0.5333 \tEXP \tDISPLAY waiting for trigger"]
+    events = [{"t": 0.0, "event": "display", "phase": "trigger"}]
+
+    def display(t, phase, **fields):
+        events.append({"t": round(t, 4), "event": "display", "phase": phase, **fields})
+
+    def presses(start, end, rate):
+        for t in np.sort(rng.uniform(start, end, rng.poisson(rate))):
+            key = str(rng.choice(['1', '3', '5']))
+            lines.append(f"{t:.4f} \tDATA \tKeypress: {key}")
+            if key != '5':  # scanner pulses are not key events
+                events.append({"t": round(t, 4), "event": "key", "key": key})
+
+    t = 0.0167
+    for trial in range(n_trials):
+        item, cond = trial % 10 + 1, int(rng.integers(1, 3))
+        fields = {"trial": trial + 1, "condition": cond, "item": item}
+        lines.append(f"{t:.4f} \tEXP \tDISPLAY first fixation")
+        display(t, "fixation")
+        presses(t, t + 12, 0.5)
+        lines += [f"{t + 12:.4f} \tEXP \tOFF first fixation", f"{t + 12:.4f} \tEXP \tDISPLAY clip: {item}_{cond}"]
+        events.append({"t": round(t + 12, 4), "event": "off", "phase": "fixation"})
+        display(t + 12, "clip", **fields)
+        presses(t + 12, t + 15, 0.3)
+        lines += [f"{t + 15:.4f} \tEXP \tOFF clip", f"{t + 15:.4f} \tEXP \tDISPLAY question"]
+        events.append({"t": round(t + 15, 4), "event": "off", "phase": "clip"})
+        display(t + 15, "question", **fields)
+        presses(t + 15, t + 18, 1.5)  # some response screens get no press
+        t += 18
+    lines += [f"{t:.4f} \tEXP \tDISPLAY final fixation", f"{t + 12:.4f} \tEXP \tDISPLAY end", f"{t + 13:.4f} \tDATA \tKeypress: space"]
+    display(t, "final fixation")
+    display(t + 12, "end")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    if events_path:
+        pd.DataFrame(events).to_json(events_path, orient="records", lines=True)
+
+def missed_scored_zero(df_bids):
+    """True if every response without a press (-1) has accuracy 0 (and there is at least one)."""
+    missed = df_bids[df_bids["trial_type"].eq("response") & df_bids["response"].eq("-1")]
+    return len(missed) > 0 and missed["accuracy"].eq("0").all()
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m logs2bids.benchmark', description="Benchmark the response extraction.")
+    parser.add_argument('--trials', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'synthetic.log')
+        events_path = os.path.join(tmp, 'synthetic_events.jsonl')
+        synthetic_log(log_path, args.trials, events_path=events_path)
+        df_log = read_log_to_dataframe(log_path)
+        # the response rows as the social converter selects them
+        df_response = df_log[
+            df_log["event_details"].str.startswith("DISPLAY question", na=False) |
+            df_log["event_details"].str.contains(r"Keypress:\s*(?!5)\S+", regex=True, na=False)
+        ]
+        df_response = df_response.loc[df_response[df_response['event_details'] == 'DISPLAY question'].first_valid_index():]
+        display_mask = df_response['event_details'] == 'DISPLAY question'
+
+        t_loop, expected = best_of(lambda: first_keypress_loop(df_response, display_mask), args.repeat)
+        t_vec, result = best_of(lambda: first_keypress_per_display(df_response, display_mask), args.repeat)
+        same = (result.index.equals(expected.index)
+                and result[["time", "event_details"]].equals(expected[["time", "event_details"]])
+                and (result["event_type"].astype(str).to_numpy() == expected["event_type"].astype(str).to_numpy()).all())
+        t_convert, df_text = best_of(lambda: social.convert(log_path), args.repeat)
+        df_stream = social.convert(events_path)
+        # both paths must agree on the responses, and a missed response is never correct
+        columns = ["condition", "response", "accuracy"]
+        responses_text = df_text.loc[df_text["trial_type"] == "response", columns].reset_index(drop=True)
+        responses_stream = df_stream.loc[df_stream["trial_type"] == "response", columns].reset_index(drop=True)
+        scored = (missed_scored_zero(df_text) and missed_scored_zero(df_stream)
+                  and responses_text.astype(str).equals(responses_stream.astype(str)))
+
+    print(f"{args.trials} trials, {len(df_log)} log lines, {int(display_mask.sum())} response screens, "
+          f"{int((result['event_details'] == 'Keypress: -1').sum())} without a press")
+    print(f"per-group loop        {t_loop * 1000:9.1f} ms")
+    print(f"vectorized            {t_vec * 1000:9.1f} ms  ({t_loop / t_vec:.0f}x)")
+    print(f"social text path      {t_convert * 1000:9.1f} ms  (whole conversion, vectorized)")
+    print("identical output" if same else "OUTPUT DIFFERS")
+    print("missed responses score 0 on the .log and _events.jsonl paths" if scored else "RESPONSE SCORING DIFFERS")
+    return 0 if same and scored else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
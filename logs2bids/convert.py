@@ -0,0 +1,50 @@
+################################################################
+## one entry point for all task converters
+##
+## convert_file() picks the task module, converts the input and
+## writes <outpath>/sub-.._ses-.._task-.._acq-..[_run-..]_events.tsv
+################################################################
+
+import os
+import json
+import importlib
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+# converter module -> (BIDS task label, numbered runs); the movie task is labelled with the movie name
+TASKS = {
+    "beliefs": ("beliefs", True),
+    "emoinf": ("emoinf", True),
+    "social": ("social", True),
+    "emomatch": ("emomatch", True),
+    "fixation": ("rest", False),
+    "movie": (None, False),
+}
+
+
+def io_root_dir():
+    """io_root_dir of the carousel's config.json, or None."""
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('io_root_dir')
+    except (OSError, ValueError):
+        return None
+
+def events_filename(subject, session, task, acq, run=None):
+    name = 'sub-{subject}_ses-{session}_task-{task}_acq-{acq}'.format(subject=subject, session=session, task=task, acq=acq)
+    if run is not None:
+        name += '_run-{run}'.format(run=run)
+    return name + '_events.tsv'
+
+def convert_file(task, infile, outpath, subject, session, acq, run=None, movie=None):
+    """Convert one log (emomatch: csv) of ``task`` and write its events.tsv; returns the output path."""
+    bids_task, has_run = TASKS[task]
+    if has_run and run is None:
+        raise ValueError(f"{task} needs a run number")
+    if task == "movie" and not movie:
+        raise ValueError("movie needs the movie name")
+    module = importlib.import_module("." + task, __package__)
+    df_bids = module.convert(infile, movie) if task == "movie" else module.convert(infile)
+    out_file = os.path.join(outpath, events_filename(subject, session, bids_task or movie, acq, run if has_run else None))
+    df_bids.to_csv(out_file, sep='\t', index=False)
+    return out_file
@@ -0,0 +1,51 @@
+################################################################
+## csv to tsv conversion for task: emomatch
+##
+## convert() takes the task .csv (not the log) and returns the
+## BIDS events table; run it through `python -m logs2bids`.
+################################################################
+
+# packages
+import pandas as pd
+
+# Define how columns should be renamed
+column_mapping = {
+    "trialOnsetTime": "onset",
+    "condition(0=checker,1=gender,2=emo)": "trial_type",
+    "condTrialNumber": "trial_number",
+    "keyPress": "response",
+    "accuracy": "accuracy",
+    "probeFileName": "probe_id",
+    "foilFileName": "foil_id",
+    "targetFileName": "target_id"
+}
+
+# Define desired column order (after renaming)
+column_order = [
+    "onset",
+    "duration",
+    "trial_type",
+    "trial_number",
+    "response",
+    "accuracy",
+    "probe_id",
+    "foil_id",
+    "target_id"
+]
+
+
+def convert(infile):
+    """
+    Loads the task CSV, renames and reorders columns.
+    :param infile: Path to input CSV file
+    """
+
+    # Load CSV
+    df = pd.read_csv(infile)
+
+    # Rename columns
+    df = df.rename(columns=column_mapping)
+    df["duration"] = 2
+
+    # Reorder columns
+    return df[column_order]
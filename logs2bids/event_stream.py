@@ -0,0 +1,91 @@
+################################################################
+## reader for the typed event streams (*_events.jsonl)
+##
+## Each task writes one JSON object per line next to its .log:
+##   t, event (display/off/key), phase, trial, condition, item, key, rt
+## Screen durations come from the next screen change and responses
+## from the key events, so nothing is parsed out of log messages.
+################################################################
+
+import numpy as np
+import pandas as pd
+
+EVENT_COLUMNS = ["t", "event", "phase", "trial", "condition", "item", "key", "rt"]
+BIDS_COLUMNS = ["onset", "duration", "trial_type", "condition", "response", "accuracy", "stimulus_id"]
+
+
+def is_event_stream(path):
+    return str(path).endswith('.jsonl')
+
+def read_events(path):
+    """Events after the trigger (the clock is reset there), in time order."""
+    events = pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+    events = events.reindex(columns=EVENT_COLUMNS)
+    trigger = np.flatnonzero((events["event"] == "display") & (events["phase"] == "trigger"))
+    if trigger.size:
+        events = events.iloc[trigger[0] + 1:]
+    events = events.astype({"t": float, "trial": "Int64", "key": "string"})
+    # numeric items come back as floats when other events have none
+    if pd.api.types.is_float_dtype(events["item"]):
+        events["item"] = events["item"].astype("Int64")
+    events["item"] = events["item"].astype("string")
+    # key events are written when they are polled, so they can come after later screens
+    return events.sort_values("t", kind="stable").reset_index(drop=True)
+
+def screens(events):
+    """Display events with their duration: the time to the next display/off event."""
+    screen = events[events["event"].isin(["display", "off"])]
+    duration = screen["t"].shift(-1) - screen["t"]
+    return screen.assign(duration=duration)[screen["event"] == "display"]
+
+def first_responses(events, phase):
+    """Displays of ``phase`` with the first key pressed before the next one (-1 if none).
+
+    duration is the time from the display to that press (0 without a press).
+    """
+    windows = events[(events["event"] == "display") & (events["phase"] == phase)].reset_index(drop=True)
+    keys = events[events["event"] == "key"]
+    window = np.searchsorted(windows["t"].to_numpy(), keys["t"].to_numpy(), side="right") - 1
+    first = keys.assign(window=window)[window >= 0].drop_duplicates("window")
+    key_t = pd.Series(np.nan, index=windows.index)
+    key_t[first["window"].to_numpy()] = first["t"].to_numpy()
+    response = pd.Series("-1", index=windows.index, dtype=object)
+    response[first["window"].to_numpy()] = first["key"].astype(str).to_numpy()
+    return windows.assign(duration=(key_t - windows["t"]).fillna(0.0), response=response)
+
+def bids_rows(screen, trial_type, condition, response, stimulus_id):
+    rows = pd.DataFrame({"onset": screen["t"].to_numpy(), "duration": screen["duration"].to_numpy()}, columns=BIDS_COLUMNS)
+    rows[["onset", "duration"]] = rows[["onset", "duration"]].astype(float).round(6)
+    rows["trial_type"] = trial_type
+    rows["condition"] = condition
+    rows["response"] = response
+    rows["accuracy"] = "na"
+    rows["stimulus_id"] = stimulus_id
+    return rows
+
+def localizer_events(events, stimulus_phase, response_phase, conditions, fixation_condition, response_stimulus_id=None):
+    """BIDS events of a story/clip localizer (fixations, stimuli, responses) in onset order.
+
+    ``conditions`` maps the design code of a trial to its name; responses get
+    the item as stimulus_id unless ``response_stimulus_id`` is given.
+    """
+    screen = screens(events)
+    fixation = screen[screen["phase"].isin(["fixation", "final fixation"])]
+    stimulus = screen[screen["phase"] == stimulus_phase]
+    response = first_responses(events, response_phase)
+    df_bids = pd.concat([
+        bids_rows(fixation, "fixation", fixation_condition, "na", "cross"),
+        bids_rows(stimulus, "stimulus", stimulus["condition"].map(conditions).to_numpy(), "na",
+                  stimulus["item"].astype(str).to_numpy()),
+        bids_rows(response, "response", response["condition"].map(conditions).to_numpy(), response["response"].to_numpy(),
+                  response["item"].astype(str).to_numpy() if response_stimulus_id is None else response_stimulus_id),
+    ], ignore_index=True)
+    return df_bids.sort_values("onset", kind="stable").reset_index(drop=True)
+
+def rest_events(events, stimulus_ids):
+    """BIDS events of a resting-state run: one row per screen in ``stimulus_ids`` (phase -> stimulus_id)."""
+    screen = screens(events)
+    screen = screen[screen["phase"].isin(list(stimulus_ids))]
+    df_bids = bids_rows(screen, screen["phase"].to_numpy(), screen["phase"].to_numpy(), "na",
+                        screen["phase"].map(stimulus_ids).to_numpy())
+    return df_bids
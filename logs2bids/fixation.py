@@ -0,0 +1,63 @@
+################################################################
+## log to tsv conversion for task: fixation/rest
+##
+## convert() takes the task .log or its _events.jsonl and returns
+## the BIDS events table; run it through `python -m logs2bids`.
+################################################################
+
+## libraries and functions
+import pandas as pd
+from .log_reader import read_log_to_dataframe
+from .event_stream import is_event_stream, read_events, rest_events
+
+## Read task log (text path)
+def bids_from_log(log_file_path):
+    df_log = read_log_to_dataframe(log_file_path)
+
+    ## Clean up df_log: filter each component then reorder by onset time.
+
+    # 0) Common to all:
+    # 0.1 remove everything before "DISPLAY first fixation" (scan not yet started)
+    mask = df_log["event_details"].eq("DISPLAY fixation cross")
+    if mask.any():
+        first_idx = mask.idxmax()  # index of first True
+        df_filter0 = df_log.loc[first_idx:]
+    else:
+        df_filter0 = df_log.copy()  # or raise an error if this must exist
+    # 0.2 Remove last row (keypress to end task)
+    df_filter0 = df_filter0.iloc[:-1]
+
+    # 1) Fixation cross filter
+    df_fixation = df_filter0[
+        df_filter0["event_details"].isin(["DISPLAY fixation cross", 'DISPLAY end'])
+    ]
+
+    ## reformat fixation dataframe
+    df_fixation_rf = pd.DataFrame(columns=["onset", "duration", "trial_type", "condition", "response", "accuracy", "stimulus_id"])
+    mask = df_fixation["event_details"].eq("DISPLAY fixation cross")
+    df_fixation_rf["onset"] = df_fixation.loc[mask==True,"time"]
+    df_fixation_rf["duration"] = df_fixation.loc[mask==False,"time"].values - df_fixation.loc[mask==True,"time"]
+    df_fixation_rf["trial_type"] = "fixation"
+    df_fixation_rf["condition"] = "fixation"
+    df_fixation_rf["response"] = "na"
+    df_fixation_rf["accuracy"] = "na"
+    df_fixation_rf["stimulus_id"] = "cross"
+
+    ## rename for simplicity
+    df_bids = df_fixation_rf
+
+    # Reset index to show original row numbers as a column
+    df_bids = df_bids.reset_index()
+    df_bids = df_bids.rename(columns={'index': 'original_row_number'})
+    df_bids = df_bids.sort_values('original_row_number').reset_index(drop=True)
+    df_bids = df_bids.drop(columns=['original_row_number'])
+    return df_bids
+
+## Read task events: typed event stream (_events.jsonl) if given, else the text log
+def convert(infile):
+    """BIDS events of a rest (fixation cross) run from its .log or _events.jsonl."""
+    if is_event_stream(infile):
+        df_bids = rest_events(read_events(infile), {'fixation': 'cross'})
+    else:
+        df_bids = bids_from_log(infile)
+    return df_bids
@@ -0,0 +1,178 @@
+################################################################
+## PsychoPy log parser shared by the task converters
+##
+## A log line is "<time> \t<LEVEL> \t<message>". The whole file is
+## read in one pass by the C csv engine (one column per line) and
+## then split on whitespace into the three columns, as
+## line.split(maxsplit=2) would. Empty lines and lines with fewer
+## than three parts are skipped; an unreadable time becomes NaN.
+##
+## localizer_events_from_log() turns the log of a story/clip
+## localizer (beliefs, emoinf, social) into its BIDS events.
+################################################################
+
+import csv
+import pandas as pd
+
+from .event_stream import BIDS_COLUMNS
+
+LOG_COLUMNS = ["time", "event_type", "event_details"]
+
+
+def read_log_to_dataframe(log_file_path):
+    # \x1f (unit separator) never occurs in a PsychoPy log, so every line is one field
+    try:
+        lines = pd.read_csv(log_file_path, sep="\x1f", header=None, names=["line"], dtype=str, engine="c",
+                            quoting=csv.QUOTE_NONE, na_filter=False, skip_blank_lines=True,
+                            on_bad_lines="skip", encoding="utf-8")["line"]
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=LOG_COLUMNS)
+    parts = lines.str.strip().str.split(n=2, expand=True).reindex(columns=range(3))
+    parts = parts[parts[2].notna()]
+    df = pd.DataFrame({
+        "time": pd.to_numeric(parts[0], errors="coerce"),
+        "event_type": parts[1].astype("category"),
+        "event_details": parts[2],
+    }, columns=LOG_COLUMNS).reset_index(drop=True)
+    return df
+
+def first_keypress_per_display(df_response, display_mask):
+    """Each display row of ``df_response`` followed by the first Keypress row before the next display.
+
+    A display without a key press is followed by a copy of itself with
+    event_details "Keypress: -1" (same time and index label). Key presses
+    before the first display are grouped like one more display (the first
+    one is kept). Rows come out in display order, as the old per-group loop
+    returned them.
+    """
+    group = display_mask.cumsum()
+    is_key = ~display_mask & df_response["event_details"].str.startswith("Keypress:", na=False)
+    displays = df_response[display_mask]
+    # first key of every group: keys sorted by position, one per group id
+    first_keys = df_response[is_key][~group[is_key].duplicated()]
+    missed = displays[~group[display_mask].isin(group[first_keys.index])]
+    missed = missed.assign(event_type="DATA", event_details="Keypress: -1")
+    df_pairs = pd.concat([displays, first_keys, missed])
+    # order: by group, the display before its key (or -1 copy)
+    order = pd.DataFrame({
+        "group": pd.concat([group[display_mask], group[first_keys.index], group[missed.index]]).to_numpy(),
+        "is_key": [0] * len(displays) + [1] * (len(first_keys) + len(missed)),
+    })
+    return df_pairs.iloc[order.sort_values(["group", "is_key"], kind="stable").index.to_numpy()]
+
+def localizer_events_from_log(df_log, stimulus_screen, response_screen, conditions, fixation_condition,
+                              response_stimulus_id=None):
+    """BIDS events of a story/clip localizer from its text log (fixations, stimuli, responses) in log order.
+
+    Stimuli are logged as "DISPLAY <stimulus_screen>: <item>_<code>" / "OFF <stimulus_screen>"
+    and response screens as "DISPLAY <response_screen>" (optionally with ": <item>_<code>").
+    ``conditions`` maps the design code of a trial (1/2) to its name. Responses get the item and
+    condition of their own message unless ``response_stimulus_id`` is given; then they get that
+    stimulus_id and the condition of their stimulus.
+    """
+    stimulus_display = "DISPLAY " + stimulus_screen
+    response_display = "DISPLAY " + response_screen
+
+    ## Clean up df_log: filter each component then reorder by onset time.
+
+    # 0) Common to all:
+    # 0.1 remove everything before "DISPLAY first fixation" (scan not yet started)
+    mask = df_log["event_details"].eq("DISPLAY first fixation")
+    if mask.any():
+        first_idx = mask.idxmax()  # index of first True
+        df_filter0 = df_log.loc[first_idx:]
+    else:
+        df_filter0 = df_log.copy()  # or raise an error if this must exist
+    # 0.2 Remove last row (keypress to end task)
+    df_filter0 = df_filter0.iloc[:-1]
+
+    # 1) Fixation cross filter
+    df_fixation = df_filter0[
+        df_filter0["event_details"].isin(["DISPLAY first fixation", "OFF first fixation", 'DISPLAY final fixation', 'DISPLAY end'])
+    ]
+
+    # 2) Stimulus on/off filter
+    df_question = df_filter0[
+        df_filter0["event_details"].str.startswith((stimulus_display), na=False) |
+        df_filter0["event_details"].isin(["OFF " + stimulus_screen])
+    ]
+
+    # 3) Response filter
+    is_display = (df_filter0["event_details"].eq(response_display) |
+                  df_filter0["event_details"].str.startswith(response_display + ":", na=False))
+    df_response = df_filter0[
+        is_display |
+        df_filter0["event_details"].str.contains(r"Keypress:\s*(?!5)\S+", regex=True, na=False)
+    ]
+
+    # Here, force the df to have the format display - reponse - display - response - etc to account for randomly pressed buttons.
+    # If a button is pressed before the first response screen is shown, it is discarded.
+    first_display_idx = df_response[is_display[df_response.index]].first_valid_index()
+    df_response = df_response.loc[first_display_idx:]
+
+    # In case of multiple button presses after a response screen is shown, we only consider the first.
+    # No button press: the response screen is followed by a 'Keypress: -1' row.
+    display_mask = is_display[df_response.index]
+    df_response = first_keypress_per_display(df_response, display_mask)
+
+
+    ## reformat fixation dataframe
+    df_fixation_rf = pd.DataFrame(columns=BIDS_COLUMNS)
+    mask = df_fixation["event_details"].eq("DISPLAY first fixation") | df_fixation["event_details"].eq("DISPLAY final fixation")
+    df_fixation_rf["onset"] = df_fixation.loc[mask==True,"time"]
+    df_fixation_rf["duration"] = df_fixation.loc[mask==False,"time"].values - df_fixation.loc[mask==True,"time"].values
+    df_fixation_rf["trial_type"] = "fixation"
+    df_fixation_rf["condition"] = fixation_condition
+    df_fixation_rf["response"] = "na"
+    df_fixation_rf["accuracy"] = "na"
+    df_fixation_rf["stimulus_id"] = "cross"
+
+
+    ## reformat stimulus dataframe
+    df_question_rf = pd.DataFrame(columns=BIDS_COLUMNS)
+    mask = df_question["event_details"].str.startswith((stimulus_display), na=False)
+    df_question_rf["onset"] = df_question.loc[mask==True,"time"]
+    df_question_rf["duration"] = df_question.loc[mask==False,"time"].values - df_question.loc[mask==True,"time"].values
+    df_question_rf["trial_type"] = "stimulus"
+    condition_full = df_question.loc[mask==True,"event_details"].values
+    df_question_rf["condition"] = condition_names(condition_full, conditions)
+    df_question_rf["response"] = "na"
+    df_question_rf["accuracy"] = "na"
+    df_question_rf["stimulus_id"] = item_numbers(condition_full)
+
+
+    ## reformat response dataframe
+    df_response_rf = pd.DataFrame(columns=BIDS_COLUMNS)
+    mask = df_response["event_details"].str.startswith(("DISPLAY"), na=False)
+    df_response_rf["onset"] = df_response.loc[mask==True,"time"]
+    df_response_rf["duration"] = df_response.loc[mask==False,"time"].values - df_response.loc[mask==True,"time"].values
+    df_response_rf["trial_type"] = "response"
+    # the whole key name: a screen without a press has "Keypress: -1"
+    df_response_rf["response"] = df_response.loc[mask==False,"event_details"].str.extract(r"Keypress:\s*(\S+)", expand=False).values
+    df_response_rf["accuracy"] = "na"
+    if response_stimulus_id is None:
+        condition_full = df_response.loc[mask==True,"event_details"].values
+        df_response_rf["condition"] = condition_names(condition_full, conditions)
+        df_response_rf["stimulus_id"] = item_numbers(condition_full)
+    else:
+        df_response_rf["condition"] = df_question_rf["condition"].values
+        df_response_rf["stimulus_id"] = response_stimulus_id
+
+
+    ## Merge the dfs
+    df_bids = pd.concat([df_fixation_rf, df_question_rf, df_response_rf], ignore_index=False)
+
+    # Reset index to show original row numbers as a column
+    df_bids = df_bids.reset_index()
+    df_bids = df_bids.rename(columns={'index': 'original_row_number'})
+    df_bids = df_bids.sort_values('original_row_number').reset_index(drop=True)
+    df_bids = df_bids.drop(columns=['original_row_number'])
+    return df_bids
+
+def condition_names(messages, conditions):
+    """Condition of every "<...>: <item>_<code>" message (code 1: conditions[1], else conditions[2])."""
+    return [conditions[1] if s[-1] == '1' else conditions[2] for s in messages]
+
+def item_numbers(messages):
+    """Item of every "<...>: <item>_<code>" message."""
+    return [s.split('_')[0].split()[-1] for s in messages]
@@ -0,0 +1,69 @@
+################################################################
+## log to tsv conversion for task: movie
+##
+## convert() takes the task .log or its _events.jsonl and returns
+## the BIDS events table; run it through `python -m logs2bids`.
+################################################################
+
+## libraries and functions
+import pandas as pd
+import numpy as np
+from .log_reader import read_log_to_dataframe
+from .event_stream import is_event_stream, read_events, rest_events
+
+## Read task log (text path)
+def bids_from_log(log_file_path, movie):
+    df_log = read_log_to_dataframe(log_file_path)
+
+    ## Clean up df_log: filter each component then reorder by onset time.
+
+    # 0) Common to all:
+    # 0.1 remove everything before "DISPLAY first fixation" (scan not yet started)
+    mask = df_log["event_details"].eq("DISPLAY fixation cross")
+    if mask.any():
+        first_idx = mask.idxmax()  # index of first True
+        df_filter0 = df_log.loc[first_idx:]
+    else:
+        df_filter0 = df_log.copy()  # or raise an error if this must exist
+    # 0.2 Remove last row (keypress to end task)
+    df_filter0 = df_filter0.iloc[:-1]
+
+    # 1) all events filter
+    df_fixation = df_filter0[
+        df_filter0["event_details"].isin(["DISPLAY fixation cross", "DISPLAY movie", "DISPLAY end"])
+    ]
+
+    ## reformat dataframe
+    df_fixation_rf = pd.DataFrame(columns=["onset", "duration", "trial_type", "condition", "response", "accuracy", "stimulus_id"])
+
+    mask_onset_cross = df_fixation["event_details"].eq("DISPLAY fixation cross")
+    mask_onset_movie = df_fixation["event_details"].eq("DISPLAY movie")
+    mask_end = df_fixation["event_details"].eq("DISPLAY end")
+
+    onset1 = df_fixation.loc[mask_onset_cross==True,"time"]
+    onset2 = df_fixation.loc[mask_onset_movie==True,"time"]
+    df_fixation_rf["onset"] = np.concatenate([onset1, onset2])
+
+    duration1 = df_fixation.loc[mask_onset_movie==True,"time"].values - df_fixation.loc[mask_onset_cross==True,"time"].values
+    duration2 = df_fixation.loc[mask_end==True,"time"].values - df_fixation.loc[mask_onset_movie==True,"time"].values
+    df_fixation_rf["duration"] = np.concatenate([duration1, duration2])
+
+    df_fixation_rf["trial_type"] = ["fixation", "movie"]
+    df_fixation_rf["condition"] = ["fixation", "movie"]
+    df_fixation_rf["response"] = ["na", "na"]
+    df_fixation_rf["accuracy"] = ["na", "na"]
+    df_fixation_rf["stimulus_id"] = ["cross", movie]
+
+
+    ## rename for simplicity
+    df_bids = df_fixation_rf
+    return df_bids
+
+## Read task events: typed event stream (_events.jsonl) if given, else the text log
+def convert(infile, movie):
+    """BIDS events of a movie run from its .log or _events.jsonl."""
+    if is_event_stream(infile):
+        df_bids = rest_events(read_events(infile), {'fixation': 'cross', 'movie': movie})
+    else:
+        df_bids = bids_from_log(infile, movie)
+    return df_bids
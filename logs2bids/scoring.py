@@ -0,0 +1,61 @@
+################################################################
+## accuracy of the response rows of an events table
+##
+## A response is correct if it is the correct key of its trial:
+## per condition for social (mental: 1, random: 3), per item from
+## a table for beliefs/emoinf (stimuli/<task>/answer_key.tsv in
+## the io root, columns item, [condition,] correct_response).
+## accuracy is 1 for a correct response within the response
+## window, 99 for a correct one given after the next event's onset
+## (onset + duration > next onset) and 0 otherwise (also for no
+## response). Without an answer key accuracy stays "na".
+################################################################
+
+import os
+import numpy as np
+import pandas as pd
+
+from .convert import io_root_dir
+
+ANSWER_KEY_FILE = 'answer_key.tsv'
+# task -> {condition: correct key} (same for every item)
+CONDITION_KEYS = {
+    "social": {"mental": "1", "random": "3"},
+}
+
+_keys = {}  # task -> answer key table (None: no key), read once per process
+
+
+def answer_key_file(task):
+    io_root = io_root_dir()
+    return os.path.join(io_root, 'stimuli', task, ANSWER_KEY_FILE) if io_root else None
+
+def answer_key(task):
+    """Correct key table of ``task`` (key columns + correct_response), or None if there is none."""
+    if task not in _keys:
+        if task in CONDITION_KEYS:
+            key = pd.DataFrame(list(CONDITION_KEYS[task].items()), columns=["condition", "correct_response"])
+        else:
+            path = answer_key_file(task)
+            key = pd.read_csv(path, sep='\t', dtype=str) if path and os.path.isfile(path) else None
+        _keys[task] = key
+    return _keys[task]
+
+def score_responses(df_bids, key):
+    """Fill the accuracy of the response rows of ``df_bids`` from the answer ``key`` (in place, also returned)."""
+    if key is None:
+        return df_bids
+    on = [c for c in ("item", "condition") if c in key.columns]
+    is_response = df_bids["trial_type"].eq("response")
+    # the item of a response is the stimulus shown before it (responses may carry a screen id instead)
+    trials = pd.DataFrame({
+        "item": df_bids["stimulus_id"].where(df_bids["trial_type"].eq("stimulus")).ffill().astype(str),
+        "condition": df_bids["condition"].astype(str),
+    })
+    correct = trials[on].merge(key.drop_duplicates(on).astype(str), how="left", on=on)["correct_response"].to_numpy()
+    hit = df_bids["response"].astype(str).to_numpy() == correct
+    overtime = (df_bids["onset"] + df_bids["duration"] > df_bids["onset"].shift(-1)).to_numpy()
+    accuracy = np.where(hit, np.where(overtime, "99", "1"), "0")
+    accuracy = np.where(pd.isna(correct), "na", accuracy)  # items missing from the key
+    df_bids.loc[is_response, "accuracy"] = accuracy[is_response.to_numpy()]
+    return df_bids
@@ -0,0 +1,25 @@
+################################################################
+## log to tsv conversion for task: social
+##
+## convert() takes the task .log or its _events.jsonl and returns
+## the BIDS events table; run it through `python -m logs2bids`.
+################################################################
+
+## libraries and functions
+from .log_reader import read_log_to_dataframe, localizer_events_from_log
+from .event_stream import is_event_stream, read_events, localizer_events
+from .scoring import answer_key, score_responses
+
+CONDITIONS = {1: 'mental', 2: 'random'}  # design code -> condition
+
+## Read task events: typed event stream (_events.jsonl) if given, else the text log
+def convert(infile):
+    """BIDS events of a social run from its .log or _events.jsonl."""
+    if is_event_stream(infile):
+        df_bids = localizer_events(read_events(infile), 'clip', 'question', CONDITIONS, 'fixation', 'resp_screen')
+    else:
+        df_bids = localizer_events_from_log(read_log_to_dataframe(infile), 'clip', 'question', CONDITIONS, 'fixation', 'resp_screen')
+
+    ## Compute accuracy
+    score_responses(df_bids, answer_key('social'))
+    return df_bids
@@ -0,0 +1,97 @@
+################################################################
+## conversion state of a rawdata tree (incremental batch runs)
+##
+## <out>/.logs2bids_state.json has one entry per events file
+## written by the batch: its input file with size, mtime and
+## content hash, and the version of the converter that wrote it
+## (a hash of the converter's source files and answer key). A run
+## is converted again only if its input is new or changed, its
+## converter changed, or its events file is gone. Inputs are re-hashed only
+## when their size or mtime changed. Entries whose input has
+## disappeared are reported as orphaned outputs.
+################################################################
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .scoring import answer_key_file
+
+STATE_NAME = '.logs2bids_state.json'  # hidden files are ignored by the BIDS validator
+SHARED_MODULES = ('convert', 'log_reader', 'event_stream', 'scoring')  # used by every task converter
+CHUNK = 1 << 20
+
+_versions = {}  # task -> converter version, computed once per process
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def converter_version(task):
+    """Hash of the source of ``task``'s converter module, the modules it shares with the others and its answer key."""
+    if task not in _versions:
+        h = hashlib.blake2b(digest_size=8)
+        for name in SHARED_MODULES + (task,):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name + '.py'), 'rb') as f:
+                h.update(f.read())
+        key_file = answer_key_file(task)
+        if key_file and os.path.isfile(key_file):
+            with open(key_file, 'rb') as f:
+                h.update(f.read())
+        _versions[task] = h.hexdigest()
+    return _versions[task]
+
+def load_state(out_root):
+    try:
+        with open(os.path.join(out_root, STATE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(out_root, state):
+    state_path = os.path.join(out_root, STATE_NAME)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+def input_entry(task, infile, st, digest):
+    return {'input': infile, 'size': st.st_size, 'mtime': st.st_mtime, 'hash': digest,
+            'converter': converter_version(task)}
+
+def plan(jobs, out_root, state, force=False):
+    """Split ``jobs`` ([(task, infile, output relative to out_root), ...]) into (to convert, up to date).
+
+    Returns the state entries the jobs will have once converted, keyed by output.
+    """
+    stats = {infile: os.stat(infile) for _, infile, _ in jobs}
+    to_hash = []
+    for task, infile, rel in jobs:
+        entry = state.get(rel)
+        st = stats[infile]
+        if not (entry and entry['input'] == infile and (entry['size'], entry['mtime']) == (st.st_size, st.st_mtime)):
+            to_hash.append(infile)
+    # hashing reads whole files; hashlib releases the GIL, so a few threads keep the disk busy
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        hashes = dict(zip(to_hash, pool.map(file_hash, to_hash)))
+
+    todo, current, entries = [], [], {}
+    for task, infile, rel in jobs:
+        entry = state.get(rel)
+        digest = hashes[infile] if infile in hashes else entry['hash']
+        entries[rel] = input_entry(task, infile, stats[infile], digest)
+        if (not force and entry and entry['input'] == infile and entry['hash'] == digest
+                and entry['converter'] == converter_version(task) and os.path.isfile(os.path.join(out_root, rel))):
+            current.append(rel)
+        else:
+            todo.append(rel)
+    return todo, current, entries
+
+def orphans(state):
+    """Outputs in ``state`` whose input file no longer exists."""
+    return sorted(rel for rel, entry in state.items() if not os.path.exists(entry['input']))
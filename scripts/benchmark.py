@@ -0,0 +1,223 @@
+# benchmark.py
+# Onset-jitter benchmark for the task loops
+#
+# Runs tasks (demo length by default) in real time against the stub renderer of
+# simulate.py (a no-op window that flips on a 60 Hz grid) while background load
+# is applied, and reports onset errors, dropped frames, key-poll latency and
+# backup-CSV write stalls as JSON. Results can be stored as a baseline and later
+# runs checked against it, e.g. before a change goes to the scanner PC:
+#
+#   python benchmark.py --save-baseline baseline.json
+#   python benchmark.py --baseline baseline.json     (exit code 1 on regression)
+
+import os
+import gc
+import csv
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+import numpy as np
+
+import simulate
+import utilities
+import config
+
+TASKS = {'cross': None, 'movie': 'cloudy', 'beliefs': '1', 'social': '1', 'emoinf': '1', 'emomatch': '1'}
+CONDITIONS = ['idle', 'cpu', 'disk', 'gc', 'all']
+
+# a result regresses when it exceeds baseline * (1 + REL_TOL) + ABS_TOL_MS (or ABS_TOL_FRAMES)
+REL_TOL = 0.25
+ABS_TOL_MS = 1.0
+ABS_TOL_FRAMES = 2
+CHECKED = ['onset_error_ms.p95', 'onset_error_ms.max', 'poll_latency_ms.p95', 'backup_write_ms.max']
+
+
+# ---------- background load ----------
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+def _disk(stop, mb_per_s, path):
+    chunk = os.urandom(1 << 20)
+    with open(path, 'wb') as f:
+        written = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            written += 1
+            if written >= 256:  # keep the file small
+                f.seek(0)
+                written = 0
+            stop.wait(max(0.0, 1.0 / mb_per_s - (time.perf_counter() - t0)))
+
+def _garbage(stop, objects_per_s):
+    per_tick = max(1, int(objects_per_s / 100))
+    while not stop.is_set():
+        for _ in range(per_tick):
+            a = []
+            a.append(a)  # reference cycles, only freed by the cyclic GC
+        stop.wait(0.01)
+
+@contextmanager
+def pressure(cpu=0, disk_mb_s=0.0, gc_objects_s=0):
+    """CPU (busy processes), disk (fsync'd writes) and GC (cyclic garbage) load."""
+    mp_stop = multiprocessing.Event()
+    stop = threading.Event()
+    procs = [multiprocessing.Process(target=_spin, args=(mp_stop,), daemon=True) for _ in range(cpu)]
+    threads = []
+    tmp_dir = tempfile.mkdtemp(prefix='carousel_bench_')
+    if disk_mb_s:
+        threads.append(threading.Thread(target=_disk, args=(stop, disk_mb_s, os.path.join(tmp_dir, 'load.bin')), daemon=True))
+    if gc_objects_s:
+        threads.append(threading.Thread(target=_garbage, args=(stop, gc_objects_s), daemon=True))
+    for worker in procs + threads:
+        worker.start()
+    try:
+        yield
+    finally:
+        mp_stop.set()
+        stop.set()
+        for worker in procs + threads:
+            worker.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def condition_load(condition, opts):
+    load = {'cpu': 0, 'disk_mb_s': 0.0, 'gc_objects_s': 0}
+    if condition in ('cpu', 'all'):
+        load['cpu'] = opts.cpu
+    if condition in ('disk', 'all'):
+        load['disk_mb_s'] = opts.disk
+    if condition in ('gc', 'all'):
+        load['gc_objects_s'] = opts.gc
+    return load
+
+
+# ---------- measurements ----------
+
+def distribution(values):
+    x = np.asarray(values, dtype=float)
+    if not len(x):
+        return {'n': 0}
+    p50, p95, p99 = np.percentile(x, [50, 95, 99])
+    return {'n': int(len(x)), 'mean': round(float(x.mean()), 3), 'p50': round(float(p50), 3),
+            'p95': round(float(p95), 3), 'p99': round(float(p99), 3), 'max': round(float(x.max()), 3)}
+
+@contextmanager
+def timed_backup_writes(stalls):
+    """Time BackupWriter.write() (the part that runs on the render thread)."""
+    write = utilities.BackupWriter.write
+
+    def timed_write(self, row):
+        t0 = time.perf_counter()
+        write(self, row)
+        stalls.append((time.perf_counter() - t0) * 1000)
+
+    utilities.BackupWriter.write = timed_write
+    try:
+        yield
+    finally:
+        utilities.BackupWriter.write = write
+
+def run_one(task, arg, condition, opts, io_root_dir):
+    io_root = simulate.scratch_io_root(io_root_dir, tempfile.mkdtemp(prefix='carousel_bench_'))
+    stalls = []
+    try:
+        with pressure(**condition_load(condition, opts)), timed_backup_writes(stalls):
+            gc.collect()
+            participant = simulate.simulate(task, '999', '01', opts.lang, arg, demo='full' if opts.full else 'demo',
+                                            seed=1, io_root_dir=io_root, realtime=True)
+        with config.io_root(io_root) as p:
+            log_dir = p.log_dirs[task]
+        with open(glob.glob(os.path.join(log_dir, '*_phases.csv'))[0], newline='') as f:
+            errors = [abs(float(r['onset_error_ms'])) for r in csv.DictReader(f)]
+        with open(glob.glob(os.path.join(log_dir, '*_timing.json'))[0]) as f:
+            timing = json.load(f)
+    finally:
+        if not opts.keep:
+            shutil.rmtree(io_root, ignore_errors=True)
+    return {
+        'onset_error_ms': distribution(errors),
+        'dropped_frames': timing['dropped_frames'],
+        'worst_interval_ms': timing['worst_interval_ms'],
+        'poll_latency_ms': distribution(np.asarray(participant.latencies) * 1000),
+        'backup_write_ms': distribution(stalls),
+    }
+
+
+# ---------- baselines ----------
+
+def _get(result, dotted):
+    for part in dotted.split('.'):
+        result = result.get(part, {}) if isinstance(result, dict) else {}
+    return result if isinstance(result, (int, float)) else None
+
+def regressions(results, baseline):
+    found = []
+    for key, runs in results['runs'].items():
+        if key not in baseline.get('runs', {}):
+            continue
+        for metric in CHECKED + ['dropped_frames']:
+            new, old = _get(runs, metric), _get(baseline['runs'][key], metric)
+            if new is None or old is None:
+                continue
+            limit = old * (1 + REL_TOL) + (ABS_TOL_FRAMES if metric == 'dropped_frames' else ABS_TOL_MS)
+            if new > limit:
+                found.append(f"{key} {metric}: {new} > {limit:.3f} (baseline {old})")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Onset-jitter benchmark for the carousel task loops.")
+    parser.add_argument('--tasks', default='beliefs,social,emomatch', help=f"comma separated, from {list(TASKS)}")
+    parser.add_argument('--conditions', default=','.join(CONDITIONS), help=f"comma separated, from {CONDITIONS}")
+    parser.add_argument('--cpu', type=int, default=max(1, (os.cpu_count() or 2) - 1), help="busy processes")
+    parser.add_argument('--disk', type=float, default=20.0, help="fsync'd MB/s written in the background")
+    parser.add_argument('--gc', type=int, default=200000, help="cyclic garbage objects/s")
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--full', action='store_true', help="full-length runs instead of demo length")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch logs of each run")
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="compare against this baseline file")
+    parser.add_argument('--save-baseline', help="also store the results as a baseline")
+    opts = parser.parse_args()
+
+    from psychopy import logging
+    io_root_dir = config.paths().io_root_dir
+    logging.console.setLevel(logging.ERROR)
+
+    results = {
+        'machine': {'node': platform.node(), 'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'load': {'cpu': opts.cpu, 'disk_mb_s': opts.disk, 'gc_objects_s': opts.gc},
+        'mode': 'full' if opts.full else 'demo',
+        'runs': {},
+    }
+    for task in opts.tasks.split(','):
+        for condition in opts.conditions.split(','):
+            key = f"{task}/{condition}"
+            results['runs'][key] = run = run_one(task, TASKS[task], condition, opts, io_root_dir)
+            print(f"{key:20s} onset p95 {run['onset_error_ms'].get('p95')} ms, max {run['onset_error_ms'].get('max')} ms, "
+                  f"dropped {run['dropped_frames']}, poll p95 {run['poll_latency_ms'].get('p95')} ms, "
+                  f"backup write max {run['backup_write_ms'].get('max')} ms")
+
+    with open(opts.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    if opts.save_baseline:
+        shutil.copyfile(opts.out, opts.save_baseline)
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            found = regressions(results, json.load(f))
+        for line in found:
+            print("REGRESSION " + line)
+        raise SystemExit(1 if found else 0)
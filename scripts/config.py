@@ -0,0 +1,132 @@
+# config.py
+# Carousel configuration, read and checked once per process
+#
+# config.json (repo root) is loaded the first time paths() is called. The io
+# root and its instructions/stimuli folders must exist, the optional settings
+# must have the right type, and the log folder of every task is created, so a
+# broken setup is reported before a task starts instead of halfway through a
+# run. Tasks get a frozen Paths object with every directory resolved.
+
+import os
+import json
+import contextlib
+import dataclasses
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
+from specs import localizer_spec_names
+
+CONFIG_FILE = Path(__file__).parent.parent / 'config.json'
+SCHEDULE_DIR = 'schedule'
+
+# task -> subfolder of logs/ and of stimuli/ (None: the task has no stimuli)
+TASK_DIRS = {
+    'cross': ('cross', None),
+    'movie': ('movies', 'movies'),
+    'emomatch': ('emomatch', 'emomatch'),
+}
+
+
+class ConfigError(ValueError):
+    """config.json is missing, malformed or points to an incomplete io root."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Paths:
+    io_root_dir: str
+    repo_dir: str
+    instructions_dir: str
+    stimuli_dir: str
+    logs_dir: str
+    schedule_dir: str
+    log_dirs: Mapping[str, str]   # task -> log folder
+    stim_dirs: Mapping[str, str]  # task -> stimulus folder
+    scanner_tr: Optional[float] = None
+    backup_fsync_every: int = 1
+
+    def instructions(self, name):
+        return os.path.join(self.instructions_dir, name)
+
+def task_dirs():
+    """task -> (logs subfolder, stimuli subfolder), including the spec-only localizers."""
+    dirs = dict(TASK_DIRS)
+    dirs.update({task: (task, task) for task in localizer_spec_names()})
+    return dirs
+
+_config = {}  # config file -> settings as read
+_paths = None  # Paths of this process
+
+
+def load_config(filename=CONFIG_FILE):
+    """Settings of ``filename`` (read once), with the types of the known keys checked."""
+    filename = str(filename)
+    if filename not in _config:
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except OSError as e:
+            raise ConfigError(f"Cannot read {filename}: {e}") from e
+        except ValueError as e:
+            raise ConfigError(f"{filename} is not valid JSON: {e}") from e
+        if not isinstance(config, dict) or not isinstance(config.get('io_root_dir'), str):
+            raise ConfigError(f"{filename} needs an \"io_root_dir\" entry (see README)")
+        tr = config.get('scanner_tr')
+        if tr is not None and (isinstance(tr, bool) or not isinstance(tr, (int, float)) or tr <= 0):
+            raise ConfigError(f"{filename}: \"scanner_tr\" must be a positive number of seconds, not {tr!r}")
+        every = config.get('backup_fsync_every', 1)
+        if isinstance(every, bool) or not isinstance(every, int) or every < 0:
+            raise ConfigError(f"{filename}: \"backup_fsync_every\" must be a whole number >= 0, not {every!r}")
+        _config[filename] = config
+    return _config[filename]
+
+def resolve(config):
+    """Paths for ``config``: checks the io root and creates the task log folders."""
+    root = os.path.abspath(os.path.expanduser(config['io_root_dir']))
+    problems = []
+    if not os.path.isdir(root):
+        problems.append(f"io root not found: {root}")
+    else:
+        for sub in ['instructions', 'stimuli']:
+            if not os.path.isdir(os.path.join(root, sub)):
+                problems.append(f"no {sub} folder in the io root: {os.path.join(root, sub)}")
+    if problems:
+        raise ConfigError("; ".join(problems) + " (refer to README for the expected structure)")
+
+    dirs = task_dirs()
+    log_dirs = {task: os.path.join(root, 'logs', log_sub) for task, (log_sub, _) in dirs.items()}
+    for log_dir in log_dirs.values():
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+        except OSError as e:
+            raise ConfigError(f"Cannot create log folder {log_dir}: {e}") from e
+    return Paths(
+        io_root_dir=root,
+        repo_dir=config.get('repo_dir', str(Path(__file__).parent.parent)),
+        instructions_dir=os.path.join(root, 'instructions'),
+        stimuli_dir=os.path.join(root, 'stimuli'),
+        logs_dir=os.path.join(root, 'logs'),
+        schedule_dir=os.path.join(root, SCHEDULE_DIR),
+        log_dirs=MappingProxyType(log_dirs),
+        stim_dirs=MappingProxyType({task: os.path.join(root, 'stimuli', stim_sub)
+                                    for task, (_, stim_sub) in dirs.items() if stim_sub}),
+        scanner_tr=config.get('scanner_tr'),
+        backup_fsync_every=config.get('backup_fsync_every', 1),
+    )
+
+def paths():
+    """Resolved paths of this process (config.json is read and checked on the first call)."""
+    global _paths
+    if _paths is None:
+        _paths = resolve(load_config())
+    return _paths
+
+@contextlib.contextmanager
+def io_root(io_root_dir):
+    """Resolve paths against another io root while the block runs (simulated and benchmark runs)."""
+    global _paths
+    saved = _paths
+    _paths = resolve(dict(load_config(), io_root_dir=io_root_dir))
+    try:
+        yield _paths
+    finally:
+        _paths = saved
@@ -4,15 +4,21 @@ import pathlib
 import os
 import csv
 from datetime import datetime
-from utilities import define_keys, Trigger, getConfig
+from utilities import define_keys, Trigger, PhaseScheduler, KeyboardSource, PulseRecorder, TextStimCache, close_task, EventStream
+from config import paths
 from psychopy import core, logging, visual, event
 
-def run_task(subject, session, language, demo):
+def run_files(subject, session, language, demo):
+    """Files this run reads (checked by the preflight before the window opens)."""
+    configPaths = paths()
+    instructions = configPaths.instructions_dir
+    return [os.path.join(instructions, 'cross_{lang}_instructions.txt'.format(lang=language)),
+            os.path.join(instructions, '{lang}_end.txt'.format(lang=language))]
+
+def run_task(subject, session, language, demo, win=None):
     
     # get directories
-    path_to_config = pathlib.Path(__file__).parent.parent
-    filename = os.path.join(path_to_config, "config.json")
-    configDirs = getConfig(filename)
+    configPaths = paths()
 
     # task name
     task = 'rest-fixation_lang-{lang}'.format(lang=language)
@@ -33,13 +39,18 @@ def run_task(subject, session, language, demo):
     logging.console.setLevel(logging.ERROR)
     
     # create log
-    rootLog = os.path.join(configDirs['io_root_dir'], "logs", "cross")
+    rootLog = configPaths.log_dirs['cross']
     logName = 'sub-{subj}_ses-{sess}_{task}_{dt}.log'.format(subj=subject, sess=session, task=task, dt=datetimestr)
     log_filename = os.path.join(rootLog, logName)
     logFile = logging.LogFile(log_filename, level=logging.EXP)
+    # typed event stream next to the log (read by logs2bids)
+    eventsName = 'sub-{subj}_ses-{sess}_{task}_{dt}_events.jsonl'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    events = EventStream(pathlib.Path(os.path.join(rootLog, eventsName)), mainClock)
 
-    # display window & get size properties
-    win = visual.Window(fullscr=True, color='black', units='height')
+    # display window & get size properties (a session passes its window in)
+    own_win = win is None
+    if own_win:
+        win = visual.Window(fullscr=True, color='black', units='height')
     win.mouseVisible = False
     win.color = 'black'
     
@@ -50,49 +61,70 @@ def run_task(subject, session, language, demo):
     fixation = visual.TextStim(win, name='fixation', text='+', font=sans, pos=(0, 0),
         height=float(.16), color='gray')
     
-    # display RS instructions
+    # Read and lay out the text screens before the trigger
     instructionsFile = 'cross_{lang}_instructions.txt'.format(lang=language)
-    instructions_path = os.path.join(configDirs['io_root_dir'], 'instructions', instructionsFile)
-    Txt.setText(open(instructions_path, 'r', encoding='utf-8').read())
-    Txt.draw()
+    instructions_path = configPaths.instructions(instructionsFile)
+    endFile = '{lang}_end.txt'.format(lang=language)
+    end_path = configPaths.instructions(endFile)
+    textCache = TextStimCache(win, font=sans, pos=(0, 0), height=float(.04), wrapWidth=1100, color='white')
+    for path in [instructions_path, end_path]:
+        textCache.get(path)
+
+    # display RS instructions
+    textCache.get(instructions_path).draw()
     win.logOnFlip(level=logging.EXP, msg='DISPLAY instructions')
+    events.on_flip(win, 'display', phase='instructions')
     win.flip()
     event.waitKeys(keyList=responseKey)
     
+    # frame-locked scheduler (onsets in seconds from the trigger)
+    scheduler = PhaseScheduler(win, mainClock)
+    keys = KeyboardSource(mainClock)
+    pulses = PulseRecorder(keys, triggerKey, nominal_tr=configPaths.scanner_tr)
+    scheduler.pollers.append(pulses.poll)
+    scheduler.events = events
+
     # launch scan
-    Trigger(mainClock, Txt, win, triggerKey)
-    
-    # display RS fixation cross
-    fixation.draw()
-    win.logOnFlip(level=logging.EXP, msg='DISPLAY fixation cross')
-    win.flip()
-    
-    # get onset time of gray fixation cross
-    fixOn = mainClock.getTime()
+    Trigger(mainClock, Txt, win, triggerKey, events=events)
+    pulses.start()
     
     # display fixation for six minutes
     if demo == 'demo':
         RS_scanDur = 5
     else:
         RS_scanDur = 360
-    fixDur = fixOn + RS_scanDur
-    clock = core.Clock()
-    while clock.getTime() < fixDur:
-        if breakKey in event.getKeys(): # check for escape
-            core.quit()
-        core.wait(0.1)  # small pause so CPU doesn’t max out
+
+    def check_break():
+        if breakKey in event.getKeys(keyList=[breakKey]): # check for escape
+            raise KeyboardInterrupt
+
+    phases_csv = 'sub-{subj}_ses-{sess}_{task}_{dt}_phases.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    timing_json = 'sub-{subj}_ses-{sess}_{task}_{dt}_timing.json'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    pulses_tsv = 'sub-{subj}_ses-{sess}_{task}_{dt}_pulses.tsv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+
+    def save_timing():
+        scheduler.save(pathlib.Path(os.path.join(rootLog, phases_csv)))
+        scheduler.frames.save(pathlib.Path(os.path.join(rootLog, timing_json)))
+        pulses.save(pathlib.Path(os.path.join(rootLog, pulses_tsv)))
+
+    # display RS fixation cross
+    try:
+        scheduler.run_phase('fixation', [fixation], duration=RS_scanDur,
+            msg='DISPLAY fixation cross', on_frame=check_break)
+    except KeyboardInterrupt:
+        # keep the timing of the partial run
+        save_timing()
+        print("Experiment aborted, timing of the partial run saved")
+        close_task(win, logFile, own_win, aborted=True, events=events)
+    save_timing()
         
     # display end of task screen
-    endFile = '{lang}_end.txt'.format(lang=language)
-    end_path = os.path.join(configDirs['io_root_dir'], "instructions", endFile)
-    Txt.setText(open(end_path, 'r', encoding='utf-8').read())
-    Txt.draw()
+    textCache.get(end_path).draw()
     win.logOnFlip(level=logging.EXP, msg='DISPLAY end')
+    events.on_flip(win, 'display', phase='end')
     win.flip()
     event.waitKeys(keyList=breakKey)
     core.wait(0.1)
 
     # clean up
-    event.clearEvents()
-    win.close()
-    core.quit()
+    close_task(win, logFile, own_win, events=events)
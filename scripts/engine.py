@@ -0,0 +1,309 @@
+# engine.py
+# Shared trial engine for the story/clip localizers (beliefs, emoinf, social)
+#
+# A localizer is a spec file in scripts/localizers/<task>.json: designs and item
+# pools (used by schedule.py), response keys, phase durations, the phases of one
+# trial (fixation, text screen or clip, optional response window), the log
+# messages and the CSV metadata names. run_localizer() preloads every screen of
+# the run before the trigger, runs the phases on the frame-locked scheduler and
+# writes the usual log/CSV files. A new localizer only needs a spec file and its
+# stimuli/instructions.
+
+import os
+import pathlib
+import functools
+import importlib
+from datetime import datetime
+from psychopy import core, logging, visual, event
+from utilities import define_keys, Trigger, save_csv, PhaseScheduler, ResponseBox, KeyboardSource, PulseRecorder, BackupWriter, LOCALIZER_CSV_HEADER, localizer_csv_row, TextStimCache, close_task, ClipPrefetcher, EventStream
+from specs import load_localizer_spec
+from config import paths
+from video_index import video_info
+from schedule import load_run
+
+SHOW_TYPES = ['fixation', 'text', 'clip']
+CSV_COLUMNS = ['fix_onset', 'stimulus', 'question']  # onset columns of LOCALIZER_CSV_HEADER
+
+
+def load_spec(task):
+    """Read and check the spec of localizer ``task``."""
+    spec = load_localizer_spec(task)
+    spec['task'] = task
+    for key in ['response_keys', 'designs', 'n_items', 'conditions', 'stimulus', 'durations', 'trial', 'meta']:
+        if key not in spec:
+            raise ValueError(f"{task}: spec has no '{key}'")
+    phases = [phase['phase'] for phase in spec['trial']]
+    for mode in ['full', 'demo']:
+        missing = set(phases) - set(spec['durations'][mode])
+        if missing or 'fixation' not in spec['durations'][mode]:
+            raise ValueError(f"{task}: no {mode} duration for {sorted(missing) or 'fixation'}")
+    for i, phase in enumerate(spec['trial']):
+        if phase.get('show') not in SHOW_TYPES:
+            raise ValueError(f"{task}: phase '{phase['phase']}' shows '{phase.get('show')}', not one of {SHOW_TYPES}")
+        if phase.get('csv') not in CSV_COLUMNS:
+            raise ValueError(f"{task}: phase '{phase['phase']}' has csv '{phase.get('csv')}', not one of {CSV_COLUMNS}")
+        # a clip is opened in the background during the phase before it
+        if phase['show'] == 'clip' and (i == 0 or spec['trial'][i - 1].get('response') or spec['trial'][i - 1]['show'] == 'clip'):
+            raise ValueError(f"{task}: a clip phase needs a fixation or text phase without responses before it")
+    if sorted(phase['csv'] for phase in spec['trial']) != sorted(CSV_COLUMNS):
+        raise ValueError(f"{task}: the phases must fill each of the CSV columns {CSV_COLUMNS} once")
+    return spec
+
+def task_runner(task):
+    """run_task() of ``task``: its own module's, or the engine's for a localizer that only has a spec file."""
+    if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), task + '.py')):
+        return importlib.import_module(task).run_task
+    return functools.partial(run_localizer, load_spec(task))
+
+def task_files(task):
+    """run_files() of ``task`` (the files a run reads), like task_runner()."""
+    if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), task + '.py')):
+        return importlib.import_module(task).run_files
+    return functools.partial(localizer_files, load_spec(task))
+
+def trial_files(spec, runSchedule, stimDir, language, n_loops):
+    """Stimulus file of every trial and phase: {(trial_idx, phase): path}."""
+    files = {}
+    for trial_idx in n_loops:
+        fields = {'stim': runSchedule['stims'][trial_idx], 'item': runSchedule['items'][trial_idx],
+                  'cond': runSchedule['design'][trial_idx], 'lang': language}
+        for phase in spec['trial']:
+            if phase['show'] != 'fixation':
+                files[trial_idx, phase['phase']] = os.path.join(stimDir, phase['file'].format(**fields))
+    return files
+
+def localizer_files(spec, subject, session, language, demo, run_number):
+    """Files a run of localizer ``spec`` reads (checked by the preflight before the window opens)."""
+    configPaths = paths()
+    instructions = configPaths.instructions_dir
+    runSchedule = load_run(configPaths.schedule_dir, spec['task'], subject, session, run_number)
+    n_loops = range(1) if demo == 'demo' else range(len(runSchedule['design']))
+    files = trial_files(spec, runSchedule, configPaths.stim_dirs[spec['task']], language, n_loops)
+    return [os.path.join(instructions, '{name}_{lang}_instructions.txt'.format(name=spec['task'], lang=language)),
+            os.path.join(instructions, '{lang}_end.txt'.format(lang=language))] + list(files.values())
+
+
+# Main task
+def run_localizer(spec, subject, session, language, demo, run_number, win=None):
+
+    # get directories
+    configPaths = paths()
+    taskName = spec['task']
+    stimDir = configPaths.stim_dirs[taskName]
+
+    # task name
+    task = 'task-{name}_lang-{lang}_run-{r}'.format(name=taskName, lang=language, r=run_number)
+
+    # Define keys
+    setKeys = define_keys('0', '5', spec['response_keys'])
+    breakKey = setKeys['break']
+    triggerKey = setKeys['trigger']
+    responseKey = setKeys['response']
+
+    # Get date and time for log name
+    now = datetime.now()
+    datetimestr = now.strftime("%Y.%m.%d_%H.%M.%S")
+
+    # set up main clock & logging features
+    mainClock = core.Clock()
+    logging.setDefaultClock(mainClock)
+    logging.console.setLevel(logging.ERROR)
+
+    # create log
+    rootLog = configPaths.log_dirs[taskName]
+    logName = 'sub-{subj}_ses-{sess}_{task}_{dt}.log'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    log_filename = os.path.join(rootLog, logName)
+    logFile = logging.LogFile(log_filename, level=logging.EXP)
+    # typed event stream next to the log (read by logs2bids)
+    eventsName = 'sub-{subj}_ses-{sess}_{task}_{dt}_events.jsonl'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    events = EventStream(pathlib.Path(os.path.join(rootLog, eventsName)), mainClock)
+
+    # set design and item order for this run (precomputed counterbalancing schedule)
+    runSchedule = load_run(configPaths.schedule_dir, taskName, subject, session, run_number)
+    design, design_label, flip_flag = runSchedule['design'], runSchedule['design_label'], runSchedule['flip']
+    trialsPerRun = len(design)
+
+    # demo: one trial with short phases
+    durations = spec['durations']['demo' if demo == 'demo' else 'full']
+    n_loops = range(1) if demo == 'demo' else range(trialsPerRun)
+    fixDur = durations['fixation']
+
+    # define behavioral arrays
+    key_vec = [0] * trialsPerRun
+    RT_vec = [0.0] * trialsPerRun
+    items = [0] * trialsPerRun
+    onsets = {column: [0.0] * trialsPerRun for column in CSV_COLUMNS}
+    stim_durations = [0.0] * trialsPerRun
+
+    # stimulus file of every phase and trial, decided up front
+    run_items = [runSchedule['items'][trial_idx] for trial_idx in n_loops]
+    files = trial_files(spec, runSchedule, stimDir, language, n_loops)
+    clipPhases = [phase['phase'] for phase in spec['trial'] if phase['show'] == 'clip']
+    # clip durations come from the video index (no need to open the clips)
+    clip_durations = {key: video_info(path)['duration'] for key, path in files.items() if key[1] in clipPhases}
+
+    # ips: clips count with the total duration of the run's clips (as social.py always computed it)
+    trialDur = sum(sum(d for key, d in clip_durations.items() if key[1] == phase['phase'])
+                   if phase['show'] == 'clip' else durations[phase['phase']] for phase in spec['trial'])
+    ips = ((trialsPerRun) * (trialDur) + (fixDur)) / 2.0
+
+    # display window & get size properties (a session passes its window in)
+    own_win = win is None
+    if own_win:
+        win = visual.Window(fullscr=True, color='black', units='height')
+    win.mouseVisible = False
+    win.color = 'black'
+
+    # text and fixation features
+    sans = ['Arial', 'Gill Sans MT', 'Helvetica', 'Verdana']
+    Txt = visual.TextStim(win, name='instruction', text='default text', font=sans, pos=(0, 0),
+        height=float(.04), wrapWidth=1100, color='white')
+    fixation = visual.TextStim(win, name='fixation', text='+', font=sans, pos=(0, 0),
+        height=float(.16), color='gray')
+
+    # Read and lay out every text screen of the run before the trigger
+    instructionsFile = '{name}_{lang}_instructions.txt'.format(name=taskName, lang=language)
+    instructions_path = configPaths.instructions(instructionsFile)
+    endFile = '{lang}_end.txt'.format(lang=language)
+    end_path = configPaths.instructions(endFile)
+    textCache = TextStimCache(win, font=sans, pos=(0, 0), height=float(.04), wrapWidth=1100, color='white')
+    for path in [instructions_path, end_path] + [path for key, path in files.items() if key[1] not in clipPhases]:
+        textCache.get(path)
+    logging.exp(textCache.report())
+
+    # display instructions
+    textCache.get(instructions_path).draw()
+    win.logOnFlip(level=logging.EXP, msg='DISPLAY instructions')
+    events.on_flip(win, 'display', phase='instructions')
+    win.flip()
+    event.waitKeys(keyList=responseKey)
+
+    # frame-locked scheduler and response window (onsets in seconds from the trigger)
+    scheduler = PhaseScheduler(win, mainClock)
+    keys = KeyboardSource(mainClock)
+    pulses = PulseRecorder(keys, triggerKey, nominal_tr=configPaths.scanner_tr)
+    scheduler.pollers.append(pulses.poll)
+    scheduler.events = events
+    responses = ResponseBox(responseKey, breakKey, keys, events=events)
+    prefetch = ClipPrefetcher(win, targetWidth=1024)
+
+    # backup CSV, appended one trial at a time from a background thread
+    tmp_csvName = 'sub-{subj}_ses-{sess}_{task}_{dt}_backup.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    tmp_csv_filename = os.path.join(rootLog, tmp_csvName)
+    backup = BackupWriter(pathlib.Path(tmp_csv_filename), LOCALIZER_CSV_HEADER,
+                          fsync_every=configPaths.backup_fsync_every)
+
+    # launch scan
+    Trigger(mainClock, Txt, win, triggerKey, events=events)
+    pulses.start()
+
+    # Start experiment
+    experimentStart = 0.0  # trigger
+    phases_csv = 'sub-{subj}_ses-{sess}_{task}_{dt}_phases.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    phases_csv_filename = os.path.join(rootLog, phases_csv)
+    timing_json = 'sub-{subj}_ses-{sess}_{task}_{dt}_timing.json'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    timing_json_filename = os.path.join(rootLog, timing_json)
+    pulses_tsv = 'sub-{subj}_ses-{sess}_{task}_{dt}_pulses.tsv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    pulses_tsv_filename = os.path.join(rootLog, pulses_tsv)
+
+    def clip_playing(movie):
+        if breakKey[0] in event.getKeys(keyList=[breakKey[0]]):
+            return False
+        return movie.isPlaying
+
+    def run_trial_phase(trial_idx, i, phase):
+        name = phase['phase']
+        fields = {'item': items[trial_idx], 'cond': design[trial_idx]}
+        eventFields = {'trial': trial_idx + 1, 'condition': design[trial_idx], 'item': items[trial_idx]}
+        kwargs = {'msg': phase['msg'].format(**fields), 'off_msg': phase.get('off_msg'), 'fields': eventFields}
+        if phase.get('response'):
+            kwargs.update(on_start=lambda t: responses.start(t, **eventFields), on_frame=responses.poll)
+        # the next phase's clip is opened in the background while this one is on screen
+        nextPhase = spec['trial'][i + 1] if i + 1 < len(spec['trial']) else None
+        if nextPhase is not None and nextPhase['show'] == 'clip':
+            clip = files[trial_idx, nextPhase['phase']]
+            kwargs.update(on_start=lambda t: prefetch.start(clip, os.path.basename(clip)), on_frame=prefetch.poll)
+
+        if phase['show'] == 'fixation':
+            onset = scheduler.run_phase(name, [fixation], duration=durations[name], **kwargs)
+            stimDur = durations[name]
+        elif phase['show'] == 'text':
+            onset = scheduler.run_phase(name, [textCache.get(files[trial_idx, name])], duration=durations[name], **kwargs)
+            stimDur = durations[name]
+        else:
+            # Play for the indexed clip duration (capped by the spec, e.g. in demo) unless the clip ends or the user breaks
+            movie = prefetch.take()
+            stimDur = clip_durations[trial_idx, name]
+            clipDur = stimDur if durations[name] is None else min(durations[name], stimDur)
+            planned_clip_onset = scheduler.next_onset
+            movie.play()
+            onset = scheduler.run_phase(name, [movie], duration=clipDur, until=lambda: clip_playing(movie), **kwargs)
+            logging.exp('clip onset gap: {name} {gap:.1f} ms'.format(name=os.path.basename(files[trial_idx, name]),
+                gap=(onset - planned_clip_onset) * 1000))
+            movie.stop()
+
+        onsets[phase['csv']][trial_idx] = onset - experimentStart
+        if phase['csv'] == 'stimulus':
+            stim_durations[trial_idx] = stimDur
+        if phase.get('response'):
+            key_vec[trial_idx] = responses.key
+            RT_vec[trial_idx] = responses.rt
+
+    try:
+        for trial_idx in n_loops:
+            items[trial_idx] = run_items[trial_idx]
+            for i, phase in enumerate(spec['trial']):
+                run_trial_phase(trial_idx, i, phase)
+
+            # Backup CSV
+            backup.write(localizer_csv_row(trial_idx, design, items, key_vec, RT_vec,
+                         onsets['fix_onset'], onsets['stimulus'], stim_durations, onsets['question']))
+
+        # Final fixation
+        scheduler.run_phase('fixation', [fixation], duration=fixDur, msg='DISPLAY final fixation',
+                            fields={'phase': 'final fixation'})
+
+        # Final save
+        experimentEnd = mainClock.getTime()
+        experimentDuration = experimentEnd - experimentStart
+        meta = {
+            "design_used_this_run": design_label,
+            "subject_flip_flag": str(int(flip_flag)),
+        }
+        for key, order in zip(spec['meta']['item_order'], runSchedule['orders']):
+            meta[key] = ",".join(map(str, order))
+        for key, used in zip(spec['meta']['items_used'], runSchedule['run_items']):
+            meta[key] = ",".join(map(str, used))
+        backup.close()
+        final_csv = 'sub-{subj}_ses-{sess}_{task}_{dt}.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+        final_csv_filename = os.path.join(rootLog, final_csv)
+        save_csv(pathlib.Path(final_csv_filename), design, items, key_vec, RT_vec,
+                 onsets['fix_onset'], onsets['stimulus'], stim_durations, onsets['question'],
+                 experiment_duration=experimentDuration, ips=ips, meta=meta)
+        scheduler.save(pathlib.Path(phases_csv_filename))
+        scheduler.frames.save(pathlib.Path(timing_json_filename))
+        pulses.save(pathlib.Path(pulses_tsv_filename))
+        print(f"Final data saved to {final_csv}")
+
+    except KeyboardInterrupt:
+        backup.close(check=False)
+        abort_csv = 'sub-{subj}_ses-{sess}_{task}_{dt}_ABORT.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+        abort_csv_filename = os.path.join(rootLog, abort_csv)
+        save_csv(pathlib.Path(abort_csv_filename), design, items, key_vec, RT_vec,
+                 onsets['fix_onset'], onsets['stimulus'], stim_durations, onsets['question'])
+        scheduler.save(pathlib.Path(phases_csv_filename))
+        scheduler.frames.save(pathlib.Path(timing_json_filename))
+        pulses.save(pathlib.Path(pulses_tsv_filename))
+        print(f"Experiment aborted, partial data saved to {abort_csv}")
+        close_task(win, logFile, own_win, aborted=True, events=events)
+
+    # display end of task screen
+    textCache.get(end_path).draw()
+    win.logOnFlip(level=logging.EXP, msg='DISPLAY end')
+    events.on_flip(win, 'display', phase='end')
+    win.flip()
+    event.waitKeys(keyList=breakKey)
+    core.wait(0.1)
+
+    # clean up
+    close_task(win, logFile, own_win, events=events)
@@ -1,9 +1,34 @@
 # main.py
-from psychopy import gui, core
+# Fast start: only the dialog layer is imported up front; the chosen task module
+# and its heavy dependencies (psychopy.visual, numpy, ...) load when needed.
+import atexit
+import startup
+with startup.timed('psychopy.gui, psychopy.core'):
+    from psychopy import gui, core
 import importlib
-from utilities import getConfig, is_valid_subject_id
-import pathlib
-import os
+with startup.timed('utilities'):
+    from utilities import is_valid_subject_id
+with startup.timed('specs'):
+    from specs import localizer_spec_names
+with startup.timed('config'):
+    import config
+
+# import cost per module, printed when the carousel exits
+atexit.register(lambda: print(startup.report()))
+
+def preflight(configPaths, paths):
+    """Stop before the window opens if a stimulus/instruction file of the run is missing or changed."""
+    with startup.timed('manifest'):
+        import manifest
+    start = core.getTime()
+    problems = manifest.preflight(configPaths.io_root_dir, paths)
+    print(f"Preflight: {len(paths)} files checked in {1000 * (core.getTime() - start):.1f} ms")
+    if problems:
+        print("ERROR: stimulus/instruction files do not match the manifest:")
+        for problem in problems:
+            print("  " + problem)
+        print("If the changes are intended, run 'python scripts/manifest.py' to update the manifest.")
+        core.quit()
 
 def main():
     
@@ -11,41 +36,28 @@ def main():
     # This name will appear in the GUI
     # note: task .py script name must match with one entry in this list (cross -> cross.py)
     list_of_tasks = ["cross", "movie", "beliefs", "social", "emoinf", "emomatch"]
+    # localizers that only have a spec file (localizers/<task>.json, run by engine.py)
+    spec_tasks = [name for name in localizer_spec_names() if name not in list_of_tasks]
+    list_of_tasks = list_of_tasks + spec_tasks
+    # "session" runs a queue of the tasks above in one window (see session.py)
 
     # -----------------------------
     # DIRECTORIES CHECK
     # -----------------------------
 
-    # Get directories according to config file
-    path_to_config = pathlib.Path(__file__).parent.parent
-    filename = os.path.join(path_to_config, "config.json")
-    configDirs = getConfig(filename)
-    message_repo_dir = 'NOTE: Config file says social carousel repo is here: {this_dir}'.format(this_dir=configDirs['repo_dir'])
-    print(message_repo_dir)
-    message_root_dir = 'NOTE: Config file says your input/output directory is here: {this_dir}'.format(this_dir=configDirs['io_root_dir'])
-    print(message_root_dir)
-    
-    # Check if io (sub)directories exist
+    # Read and check the config once: io root, instructions/stimuli folders,
+    # settings; the task log folders are created here
     try:
-
-        if pathlib.Path(configDirs['io_root_dir']).exists():
-            print('Found input/output directory')
-        else:
-            logsDir = os.path.join(configDirs['io_root_dir'], "logs")
-            instructionsDir = os.path.join(configDirs['io_root_dir'], "instructions")
-            stimDir = os.path.join(configDirs['io_root_dir'], "stimuli")
-            if pathlib.Path(logsDir).exists():
-                print('Found logs directory')
-            if pathlib.Path(instructionsDir).exists():
-                print('Found instructions directory')
-            if pathlib.Path(stimDir).exists():
-                print('Found stimuli directory')
-
-    except Exception as e:
+        configPaths = config.paths()
+    except config.ConfigError as e:
         print("Refer to README in social carousel repo for expected structure.")
         print("ERROR in directory setup: ")
         print(e)
         core.quit()
+    message_repo_dir = 'NOTE: Config file says social carousel repo is here: {this_dir}'.format(this_dir=configPaths.repo_dir)
+    print(message_repo_dir)
+    message_root_dir = 'NOTE: Config file says your input/output directory is here: {this_dir}'.format(this_dir=configPaths.io_root_dir)
+    print(message_root_dir)
 
     # -----------------------------
     # GUI SETUP
@@ -56,9 +68,10 @@ def main():
         "Session:": ["01", "02"],
         "Language:": ["de", "en"],
         "Mode:": ["full", "demo"],
-        "Select Task:": list_of_tasks
+        "Select Task:": list_of_tasks + ["session"]
     }
 
+    print(f"Startup: dialog ready after {startup.elapsed():.2f} s")
     dlg = gui.DlgFromDict(dictionary=info, 
         title="Social Carousel", 
         tip=None, 
@@ -105,12 +118,41 @@ def main():
     # if not dlg_order.OK:
     #     core.quit()
 
+    # -----------------------------
+    # Session: several tasks in one window
+    # -----------------------------
+    if task_choice == "session":
+        with startup.timed('session'):
+            import session as session_runner
+        infoQueue = {
+            "Task queue (task:run or movie, comma separated):": session_runner.DEFAULT_QUEUE,
+        }
+
+        dlg2 = gui.DlgFromDict(dictionary=infoQueue, 
+            title="Social Carousel", 
+            tip=None, 
+            sortKeys=False
+        )
+        if dlg2.OK == False:
+            core.quit()
+
+        try:
+            queue = session_runner.parse_queue(infoQueue["Task queue (task:run or movie, comma separated):"])
+        except ValueError as e:
+            print("Invalid session queue!")
+            print(e)
+            core.quit()
+
+        preflight(configPaths, session_runner.session_files(subject_id, session, language, demo, queue))
+        session_runner.run_session(subject_id, session, language, demo, queue)
+        return
+
     # -----------------------------
     # Special extra GUI for specific tasks
     # -----------------------------
     run_number = None
     
-    if task_choice == "beliefs" or task_choice == "social" or task_choice == "emoinf" or task_choice == "emomatch":
+    if task_choice == "beliefs" or task_choice == "social" or task_choice == "emoinf" or task_choice == "emomatch" or task_choice in spec_tasks:
         infoRun = {
             "Select run:": ["1", "2"],
         }
@@ -151,6 +193,7 @@ def main():
         list_of_tasks[4] : list_of_tasks[4],
         list_of_tasks[5] : list_of_tasks[5]
     }
+    task_map.update({name: 'engine' for name in spec_tasks})
 
     task_module_name = task_map[task_choice]
 
@@ -159,10 +202,23 @@ def main():
     # Each task script must contain a run_task() function
     # -----------------------------
     try:
-        task_module = importlib.import_module(task_module_name)
+        with startup.timed(task_module_name):
+            task_module = importlib.import_module(task_module_name)
+
+        # Check the files this run reads before the window opens
+        if task_choice in spec_tasks:
+            preflight(configPaths, task_module.task_files(task_choice)(subject_id, session, language, demo, run_number))
+        elif task_choice == "movie":
+            preflight(configPaths, task_module.run_files(subject_id, session, language, demo, movie_id))
+        elif run_number is not None:
+            preflight(configPaths, task_module.run_files(subject_id, session, language, demo, run_number))
+        else:
+            preflight(configPaths, task_module.run_files(subject_id, session, language, demo))
 
         # Call correct version of the task
-        if task_choice == "beliefs" or task_choice == "social" or task_choice == "emoinf" or task_choice == "emomatch":
+        if task_choice in spec_tasks:
+            task_module.task_runner(task_choice)(subject_id, session, language, demo, run_number)
+        elif task_choice == "beliefs" or task_choice == "social" or task_choice == "emoinf" or task_choice == "emomatch":
             task_module.run_task(subject_id, session, language, demo, run_number)
         elif task_choice == "movie":
             task_module.run_task(subject_id, session, language, demo, movie_id)
@@ -0,0 +1,144 @@
+# manifest.py
+# Stimulus manifest and preflight check
+#
+# manifest.json in the io root lists every file under stimuli/ and instructions/
+# with size, mtime and content hash. Hashes are only recomputed for files whose
+# size or mtime changed. The preflight compares the files a run will use with
+# the manifest using os.stat only, so it can run before every scan.
+#
+#   python manifest.py            build/refresh the manifest
+#   python manifest.py --verify   re-hash every file and report differences (the manifest is not updated)
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_DIRS = ('stimuli', 'instructions')
+SKIP_NAMES = ('video_index.json', 'textures.npy', 'textures.json', '.DS_Store')  # built from the stimuli
+CHUNK = 1 << 20
+
+_manifests = {}  # io root -> manifest, loaded once per process
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _walk(io_root_dir):
+    """(relative path, stat) of every file in the manifest folders."""
+    stack = [os.path.join(io_root_dir, d) for d in MANIFEST_DIRS if os.path.isdir(os.path.join(io_root_dir, d))]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name not in SKIP_NAMES and not entry.name.endswith('.tmp'):
+                    yield os.path.relpath(entry.path, io_root_dir).replace(os.sep, '/'), entry.stat()
+
+def _hash_all(io_root_dir, rels):
+    """rel -> content hash of ``rels``."""
+    # hashing reads whole files; hashlib releases the GIL, so a few threads keep the disk busy
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        return dict(zip(rels, pool.map(lambda r: file_hash(os.path.join(io_root_dir, r)), rels)))
+
+def build_manifest(io_root_dir):
+    """Write and return the manifest of ``io_root_dir``, hashing only new or changed files."""
+    manifest_path = os.path.join(io_root_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+
+    manifest, to_hash = {}, []
+    for rel, st in _walk(io_root_dir):
+        entry = old.get(rel)
+        if entry and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime:
+            manifest[rel] = entry
+        else:
+            manifest[rel] = {'size': st.st_size, 'mtime': st.st_mtime}
+            to_hash.append(rel)
+    for rel, digest in _hash_all(io_root_dir, to_hash).items():
+        manifest[rel]['hash'] = digest
+
+    if manifest != old:
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    _manifests[os.path.abspath(io_root_dir)] = manifest
+    return manifest
+
+def load_manifest(io_root_dir):
+    """Manifest as last built, or None if there is none yet."""
+    io_root_dir = os.path.abspath(io_root_dir)
+    if io_root_dir not in _manifests:
+        try:
+            with open(os.path.join(io_root_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                _manifests[io_root_dir] = json.load(f)
+        except (OSError, ValueError):
+            return None
+    return _manifests[io_root_dir]
+
+def preflight(io_root_dir, paths):
+    """Problems with the files in ``paths``: missing, empty, or changed since the manifest was built."""
+    manifest = load_manifest(io_root_dir)
+    if manifest is None:
+        # not built here: a manifest taken now would match the files by construction
+        return [f"no {MANIFEST_NAME} in {io_root_dir}: run 'python scripts/manifest.py' to build it"]
+    problems = []
+    for path in dict.fromkeys(paths):
+        rel = os.path.relpath(path, io_root_dir).replace(os.sep, '/')
+        try:
+            st = os.stat(path)
+        except OSError:
+            problems.append(f"missing: {rel}")
+            continue
+        entry = manifest.get(rel)
+        if st.st_size == 0:
+            problems.append(f"empty: {rel}")
+        elif entry is None:
+            problems.append(f"not in manifest (new file?): {rel}")
+        elif entry['size'] != st.st_size or entry['mtime'] != st.st_mtime:
+            problems.append(f"changed since the manifest was built: {rel}")
+    return problems
+
+def verify(io_root_dir):
+    """Re-hash every file and compare with the manifest (which is left as it is).
+
+    Returns the files whose content differs, those missing on disk and those not in the manifest.
+    """
+    manifest = load_manifest(io_root_dir) or {}
+    on_disk = [rel for rel, _ in _walk(io_root_dir)]
+    hashes = _hash_all(io_root_dir, on_disk)
+    changed = sorted(rel for rel in on_disk if rel in manifest and manifest[rel].get('hash') != hashes[rel])
+    removed = sorted(rel for rel in manifest if rel not in hashes)
+    added = sorted(rel for rel in on_disk if rel not in manifest)
+    return changed, removed, added
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from config import paths
+    io_root_dir = paths().io_root_dir
+    start = time.perf_counter()
+    if '--verify' in sys.argv:
+        changed, removed, added = verify(io_root_dir)
+        for rel in changed:
+            print(f"content changed: {rel}")
+        for rel in removed:
+            print(f"removed: {rel}")
+        for rel in added:
+            print(f"not in manifest: {rel}")
+        print(f"{len(changed)} changed, {len(removed)} removed, {len(added)} not in manifest "
+              f"({time.perf_counter() - start:.2f} s)")
+        if changed or removed or added:
+            print("If the changes are intended, run 'python scripts/manifest.py' to update the manifest.")
+    else:
+        manifest = build_manifest(io_root_dir)
+        print(f"{len(manifest)} files in {os.path.join(io_root_dir, MANIFEST_NAME)} ({time.perf_counter() - start:.2f} s)")
@@ -8,17 +8,30 @@
 import pathlib
 import os
 from datetime import datetime
-from utilities import define_keys, Trigger, getConfig, getDimensions
+from utilities import define_keys, Trigger, getDimensions, PhaseScheduler, KeyboardSource, PulseRecorder, TextStimCache, close_task, EventStream
+from config import paths
 from psychopy import core, logging, visual, event
 from psychopy.visual import MovieStim
 
+def movie_file(movie_name, language):
+    if 'cloudy' in movie_name:
+        return 'partly_cloudy.mp4'
+    elif 'lotr' in movie_name:
+        return 'council_of_elrond_{lang}.mp4'.format(lang=language)
+
+def run_files(subject, session, language, demo, movie_name):
+    """Files this run reads (checked by the preflight before the window opens)."""
+    configPaths = paths()
+    instructions = configPaths.instructions_dir
+    return [os.path.join(configPaths.stim_dirs['movie'], movie_file(movie_name, language)),
+            os.path.join(instructions, 'movie_{lang}_instructions.txt'.format(lang=language)),
+            os.path.join(instructions, '{lang}_end.txt'.format(lang=language))]
+
 # Main task
-def run_task(subject, session, language, demo, movie_name):
+def run_task(subject, session, language, demo, movie_name, win=None):
 
     # get directories
-    path_to_config = pathlib.Path(__file__).parent.parent
-    filename = os.path.join(path_to_config, "config.json")
-    configDirs = getConfig(filename)
+    configPaths = paths()
 
     # task name
     task = 'rest-movie-{mn}_lang-{lang}'.format(mn=movie_name, lang=language)
@@ -30,13 +43,9 @@ def run_task(subject, session, language, demo, movie_name):
     responseKey = setKeys['response']
     
     # Fetch movie name
-    rootMovie = os.path.join(configDirs['io_root_dir'], "stimuli", "movies")
-    if 'cloudy' in movie_name:
-        movieFilename = 'partly_cloudy.mp4'
-        clip = os.path.join(rootMovie, movieFilename)
-    elif 'lotr' in movie_name:
-        movieFilename = 'council_of_elrond_{lang}.mp4'.format(lang=language)
-        clip = os.path.join(rootMovie, movieFilename)
+    rootMovie = configPaths.stim_dirs['movie']
+    movieFilename = movie_file(movie_name, language)
+    clip = os.path.join(rootMovie, movieFilename)
     
     # Get date and time for log name
     now = datetime.now()
@@ -48,13 +57,18 @@ def run_task(subject, session, language, demo, movie_name):
     logging.console.setLevel(logging.ERROR)
     
     # create log
-    rootLog = os.path.join(configDirs['io_root_dir'], "logs", "movies")
+    rootLog = configPaths.log_dirs['movie']
     logName = 'sub-{subj}_ses-{sess}_{task}_{dt}.log'.format(subj=subject, sess=session, task=task, dt=datetimestr)
     log_filename = os.path.join(rootLog, logName)
     logFile = logging.LogFile(log_filename, level=logging.EXP)
+    # typed event stream next to the log (read by logs2bids)
+    eventsName = 'sub-{subj}_ses-{sess}_{task}_{dt}_events.jsonl'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    events = EventStream(pathlib.Path(os.path.join(rootLog, eventsName)), mainClock)
     
-    # display window & get size properties
-    win = visual.Window(fullscr=True, color='black', units='height')
+    # display window & get size properties (a session passes its window in)
+    own_win = win is None
+    if own_win:
+        win = visual.Window(fullscr=True, color='black', units='height')
     win.mouseVisible = False
     win.color = 'black'
     
@@ -65,60 +79,71 @@ def run_task(subject, session, language, demo, movie_name):
     fixation = visual.TextStim(win, name='fixation', text='+', font=sans, pos=(0, 0),
         height=float(.16), color='gray')
     
-    # display instructions
+    # Read and lay out the text screens before the trigger
     instructionsFile = 'movie_{lang}_instructions.txt'.format(lang=language)
-    instructions_path = os.path.join(configDirs['io_root_dir'], 'instructions', instructionsFile)
-    Txt.setText(open(instructions_path, 'r', encoding='utf-8').read())
-    Txt.draw()
+    instructions_path = configPaths.instructions(instructionsFile)
+    endFile = '{lang}_end.txt'.format(lang=language)
+    end_path = configPaths.instructions(endFile)
+    textCache = TextStimCache(win, font=sans, pos=(0, 0), height=float(.04), wrapWidth=1100, color='white')
+    for path in [instructions_path, end_path]:
+        textCache.get(path)
+
+    # display instructions
+    textCache.get(instructions_path).draw()
     win.logOnFlip(level=logging.EXP, msg='DISPLAY instructions')
+    events.on_flip(win, 'display', phase='instructions')
     win.flip()
     event.waitKeys(keyList=responseKey)
     
+    # frame-locked scheduler (onsets in seconds from the trigger)
+    scheduler = PhaseScheduler(win, mainClock)
+    keys = KeyboardSource(mainClock)
+    pulses = PulseRecorder(keys, triggerKey, nominal_tr=configPaths.scanner_tr)
+    scheduler.pollers.append(pulses.poll)
+    scheduler.events = events
+
     # launch scan
-    Trigger(mainClock, Txt, win, triggerKey)
+    Trigger(mainClock, Txt, win, triggerKey, events=events)
+    pulses.start()
     
     # display RS fixation cross
-    fixation.draw()
-    win.logOnFlip(level=logging.EXP, msg='DISPLAY fixation cross')
-    win.flip()
-    clock = core.Clock()
-    core.wait(2)
+    fixOn = scheduler.run_phase('fixation', [fixation], duration=2.0, msg='DISPLAY fixation cross')
     
     # Play until movie finishes or user presses a key
     dims = getDimensions(clip)
     targetWidth = 1024
     aspectRatio = dims[0] / dims[1]
     targetHeight = round(targetWidth / aspectRatio)
-    win.logOnFlip(level=logging.EXP, msg='DISPLAY movie')
     movie = visual.MovieStim(win, clip, loop=False, noAudio=False, name=movie_name, size=(targetWidth,targetHeight))
     movieOn = mainClock.getTime() # onset time
-    movie.play()
-
     demo_end_time = movieOn + 5 if demo == 'demo' else float('inf')  # set the end time for the demo condition
-    while movie.isPlaying and mainClock.getTime() < demo_end_time:
-        movie.draw()
-        win.flip()
-        if breakKey[0] in event.getKeys():
-            break
 
+    def movie_playing():
+        if breakKey[0] in event.getKeys(keyList=[breakKey[0]]):
+            return False
+        return movie.isPlaying and mainClock.getTime() < demo_end_time
+
+    movie.play()
+    scheduler.run_phase('movie', [movie], msg='DISPLAY movie', until=movie_playing, fields={'item': movie_name})
     movie.stop()
+    phases_csv = 'sub-{subj}_ses-{sess}_{task}_{dt}_phases.csv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    scheduler.save(pathlib.Path(os.path.join(rootLog, phases_csv)))
+    timing_json = 'sub-{subj}_ses-{sess}_{task}_{dt}_timing.json'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    scheduler.frames.save(pathlib.Path(os.path.join(rootLog, timing_json)))
+    pulses_tsv = 'sub-{subj}_ses-{sess}_{task}_{dt}_pulses.tsv'.format(subj=subject, sess=session, task=task, dt=datetimestr)
+    pulses.save(pathlib.Path(os.path.join(rootLog, pulses_tsv)))
     
     # small break if lotr
     if 'lotr' in movie_name:
         core.wait(2)
     
     # display end of task screen
-    endFile = '{lang}_end.txt'.format(lang=language)
-    end_path = os.path.join(configDirs['io_root_dir'], "instructions", endFile)
-    with open(end_path, 'r', encoding='utf-8') as f:
-        Txt.setText(f.read())
-    Txt.draw()
+    textCache.get(end_path).draw()
     win.logOnFlip(level=logging.EXP, msg='DISPLAY end')
+    events.on_flip(win, 'display', phase='end')
     win.flip()
     event.waitKeys(keyList=breakKey)
     core.wait(0.1)
     
     # clean up
-    event.clearEvents()
-    win.close()
-    core.quit()
\ No newline at end of file
+    close_task(win, logFile, own_win, events=events)
\ No newline at end of file
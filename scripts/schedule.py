@@ -0,0 +1,445 @@
+# schedule.py
+# Precomputed counterbalancing schedule for all subjects, sessions, runs and tasks
+#
+# The whole schedule is built in one pass and stored as a fixed-slot structured
+# .npy file (one record per task/subject/session/run), so a task reads its run
+# with a single memory-mapped lookup. The reference helpers below are the ones
+# the tasks used to call at every run start; the table is built to match them.
+#
+#   python schedule.py            build/refresh the schedule in <io_root_dir>/schedule
+#   python schedule.py --check    print balance checks over all subjects
+
+import os
+import json
+import hashlib
+import numpy as np
+from specs import localizer_spec_names, load_localizer_spec
+from config import paths
+
+SCHEDULE_FILE = 'schedule.npy'
+N_SUBJECTS = 1000  # subject IDs 000-999 (see is_valid_subject_id)
+N_SESSIONS = 2
+N_RUNS = 2
+
+# localizers (from their spec files): designs D1/D2, items per condition,
+# condition prefixes and the stimulus name pattern
+SCHEDULE_KEYS = ['designs', 'n_items', 'conditions', 'stimulus']
+LOCALIZERS = {name: {key: load_localizer_spec(name)[key] for key in SCHEDULE_KEYS}
+              for name in localizer_spec_names()}
+# emomatch: miniblock configurations and item pool sizes (checkerboards, face identities per gender)
+EMOMATCH_MINIBLOCKS = [[0, 1, 2], [0, 2, 1], [1, 0, 2], [1, 2, 0], [2, 1, 0], [2, 0, 1]]
+EMOMATCH_POOLS = [21, 9, 9]  # cb, gender, emo
+TASKS = list(LOCALIZERS) + ['emomatch']
+
+MAX_TRIALS = 10
+MAX_ORDER = 21
+SCHEDULE_DTYPE = np.dtype([
+    ('task', 'S8'), ('subject', 'u2'), ('session', 'u1'), ('run', 'u1'),
+    ('design_label', 'S2'), ('flip', '?'),
+    ('n_trials', 'u1'),
+    ('condition', 'u1', (MAX_TRIALS,)),      # 1/2 per trial (localizers)
+    ('item', 'u1', (MAX_TRIALS,)),           # item number per trial (localizers)
+    ('stim', 'S16', (MAX_TRIALS,)),          # stimulus stem per trial, e.g. b'9b', b'mental_2.AVI'
+    ('n_order', 'u1', (3,)),
+    ('order', 'u1', (3, MAX_ORDER)),         # session item order per condition (emomatch: cb/gen/emo order of the run)
+    ('blocks', 'u1', (len(EMOMATCH_MINIBLOCKS), 3)),  # emomatch miniblock order (run 1 from the front, run 2 from the back)
+])
+
+_tables = {}  # schedule path -> memory-mapped table
+
+
+# ---------- reference helpers (what the tasks computed at run start) ----------
+
+def get_pair_seed(subject_id: str) -> int:
+    """Deterministic seed based on subjID (stable across runs/machines)."""
+    # Convert subject ID (e.g., '001') into a pair index:
+    # 001–002 -> seed 1
+    # 003–004 -> seed 2
+    # ...
+    # 049–050 -> seed 25
+    sid = int(subject_id)
+    id_in_pair = sid % 2
+    pair_index = (sid - 1) // 2 + 1   # groups of 2
+    h = hashlib.md5(str(pair_index).encode("utf-8")).hexdigest()
+    return int(h[:8], 16), id_in_pair
+
+def get_string_seed(text: str) -> int:
+    """Seed from any string (emomatch: subject ID, or subject+session+run)."""
+    h = hashlib.md5(text.encode("utf-8")).hexdigest()
+    return int(h[:8], 16)
+
+def pick_design_for_run(task, run: int, subj_id: str):
+    """Half of subjects get D1 in run1, half D2 in run1 (deterministic)."""
+    # Determined on subject pair so a given pair starts with the same design
+    D1, D2 = LOCALIZERS[task]['designs']
+    seedFlip, id_in_pair = get_pair_seed(subj_id)
+    flip = (seedFlip % 2) == 1
+    if run == 1:
+        return (D2 if flip else D1), ("D2" if flip else "D1"), flip
+    else:
+        return (D1 if flip else D2), ("D1" if flip else "D2"), flip
+
+def item_orders_for_subject(task, subj_id: str, session: str):
+    n_items = LOCALIZERS[task]['n_items']
+    half = n_items // 2
+    seed, id_in_pair = get_pair_seed(subj_id)
+    rng = np.random.default_rng(seed)
+    order_1 = rng.permutation(np.arange(1, n_items + 1))
+    order_2 = rng.permutation(np.arange(1, n_items + 1))
+    first_half = (id_in_pair == 0) == (session == "01")
+    if first_half:
+        return order_1[0:half], order_2[0:half]
+    return order_1[half:], order_2[half:]
+
+def items_for_run(task, run: int, subj_id: str, session: str):
+    """Item number and stimulus name of every trial of a run, drawn trial by trial as the tasks did."""
+    spec = LOCALIZERS[task]
+    orders = item_orders_for_subject(task, subj_id, session)
+    # run 2 continues each condition's order where run 1 stopped
+    used = [0, 0]
+    for r in range(1, run + 1):
+        design, _, _ = pick_design_for_run(task, r, subj_id)
+        items, stims = [], []
+        for trialT in design:
+            item = int(orders[trialT - 1][used[trialT - 1]])
+            used[trialT - 1] += 1
+            items.append(item)
+            stims.append(spec['stimulus'].format(pref=spec['conditions'][trialT - 1], item=item))
+    return items, stims
+
+def pick_design_for_subj(subj_id: str, run: int, n_loops):
+    """emomatch: miniblock order of a run (permuted per subject)."""
+    rng = np.random.default_rng(get_string_seed(subj_id))
+    order_mb = rng.permutation(np.arange(0, len(EMOMATCH_MINIBLOCKS)))
+    miniblocks_perm = [EMOMATCH_MINIBLOCKS[i] for i in order_mb]
+    if run == 1:
+        return miniblocks_perm[0:n_loops]
+    else:
+        return miniblocks_perm[-n_loops:]
+
+def emomatch_item_orders(subj_id: str, ses: str, run: str):
+    """emomatch: checkerboard, gender and emotion item orders (randomized by subject ID, session and run)."""
+    rng = np.random.default_rng(get_string_seed(subj_id + ses + run))
+    return [rng.permutation(np.arange(1, n + 1)) for n in EMOMATCH_POOLS]
+
+
+# ---------- building the table ----------
+
+def slot(task, subject, session, run):
+    """Record index of a task/subject/session/run."""
+    return ((TASKS.index(task) * N_SUBJECTS + int(subject)) * N_SESSIONS + int(session) - 1) * N_RUNS + int(run) - 1
+
+def spec_hash():
+    """Changes whenever the counterbalancing parameters or the code building the table (this file) change."""
+    spec = json.dumps([LOCALIZERS, EMOMATCH_MINIBLOCKS, EMOMATCH_POOLS, N_SUBJECTS, SCHEDULE_DTYPE.descr])
+    h = hashlib.md5(spec.encode("utf-8"))
+    with open(os.path.abspath(__file__), 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()[:12]
+
+def _pair_orders(n_pairs, n_items):
+    """Seed flip bit and both condition orders of every subject pair (index = pair index)."""
+    flips = np.zeros(n_pairs, dtype=bool)
+    orders = np.zeros((n_pairs, 2, n_items), dtype=np.uint8)
+    for pair_index in range(n_pairs):
+        seed = get_string_seed(str(pair_index))
+        flips[pair_index] = seed % 2 == 1
+        # the draws themselves stay sequential per pair: the orders must stay bit-identical
+        rng = np.random.default_rng(seed)
+        orders[pair_index, 0] = rng.permutation(np.arange(1, n_items + 1))
+        orders[pair_index, 1] = rng.permutation(np.arange(1, n_items + 1))
+    return flips, orders
+
+def _build_localizer(table, task):
+    spec = LOCALIZERS[task]
+    D = np.array(spec['designs'], dtype=np.uint8)      # (2 designs, T)
+    n_trials = D.shape[1]
+    half = spec['n_items'] // 2
+    if n_trials > MAX_TRIALS or half > MAX_ORDER or len(task) > 8:
+        raise ValueError(f"{task}: at most {MAX_TRIALS} trials per run, {2 * MAX_ORDER} items per condition and 8 characters in the task name")
+    if max((D == 1).sum(), (D == 2).sum()) > half:
+        raise ValueError(f"{task}: the two designs use more items of a condition than one session half ({half}) holds")
+
+    sid = np.arange(N_SUBJECTS)
+    id_in_pair = sid % 2
+    pair = (sid - 1) // 2 + 1
+    flips, pair_orders = _pair_orders(pair.max() + 1, spec['n_items'])
+    flip = flips[pair]                                     # (S,)
+    orders = pair_orders[pair]                             # (S, cond, n_items)
+
+    # session halves: first half in session 01 for even IDs, in session 02 for odd IDs
+    first = np.stack([id_in_pair == 0, id_in_pair == 1], axis=1)                 # (S, sess)
+    session_orders = np.where(first[:, :, None, None], orders[:, None, :, :half],
+                              orders[:, None, :, half:])                        # (S, sess, cond, half)
+
+    # designs per run: D1/D2 in run 1 and the other one in run 2 (swapped for flipped pairs)
+    design_idx = np.stack([flip.astype(int), 1 - flip.astype(int)], axis=1)     # (S, run) -> 0=D1, 1=D2
+    designs = D[design_idx]                                                     # (S, run, T)
+
+    # item per trial: run 1 starts at the front of each condition's order, run 2
+    # continues where run 1 stopped
+    is_c = designs[..., None] == np.array([1, 2])                               # (S, run, T, cond)
+    rank = np.cumsum(is_c, axis=2) - 1
+    rank[:, 1] += is_c[:, 0].sum(axis=1)[:, None, :]
+    cond = designs.astype(int) - 1                                               # (S, run, T)
+    pos = np.take_along_axis(rank, cond[..., None], axis=-1)[..., 0]             # (S, run, T)
+    items = session_orders[sid[:, None, None, None], np.arange(N_SESSIONS)[None, :, None, None],
+                           cond[:, None], pos[:, None]]                          # (S, sess, run, T)
+
+    # stimulus name of every condition/item, e.g. '7b' or 'mental_3.AVI'
+    names = np.array([[spec['stimulus'].format(pref=pref, item=item) for item in range(spec['n_items'] + 1)]
+                      for pref in spec['conditions']])
+    if max(len(name.encode()) for name in names.ravel()) > SCHEDULE_DTYPE['stim'].base.itemsize:
+        raise ValueError(f"{task}: stimulus names are too long for the schedule table")
+    stims = names[cond[:, None], items]                                         # (S, sess, run, T)
+
+    start = slot(task, 0, 1, 1)
+    rows = table[start:start + N_SUBJECTS * N_SESSIONS * N_RUNS].reshape(N_SUBJECTS, N_SESSIONS, N_RUNS)
+    rows['task'] = task
+    rows['subject'] = sid[:, None, None]
+    rows['session'] = np.arange(1, N_SESSIONS + 1)[None, :, None]
+    rows['run'] = np.arange(1, N_RUNS + 1)[None, None, :]
+    rows['flip'] = flip[:, None, None]
+    rows['design_label'] = np.where(design_idx == 0, 'D1', 'D2')[:, None, :]
+    rows['n_trials'] = n_trials
+    rows['condition'][..., :n_trials] = designs[:, None]
+    rows['item'][..., :n_trials] = items
+    rows['stim'][..., :n_trials] = stims
+    rows['n_order'] = [half, half, 0]
+    rows['order'][..., :2, :half] = session_orders[:, :, None]
+
+def _build_emomatch(table):
+    start = slot('emomatch', 0, 1, 1)
+    rows = table[start:start + N_SUBJECTS * N_SESSIONS * N_RUNS].reshape(N_SUBJECTS, N_SESSIONS, N_RUNS)
+    miniblocks = np.array(EMOMATCH_MINIBLOCKS, dtype=np.uint8)
+    for s in range(N_SUBJECTS):
+        subject = '{:03d}'.format(s)
+        rows[s]['blocks'] = miniblocks[np.random.default_rng(get_string_seed(subject)).permutation(len(miniblocks))]
+        for sess in range(N_SESSIONS):
+            for run in range(N_RUNS):
+                rng = np.random.default_rng(get_string_seed(subject + '{:02d}'.format(sess + 1) + str(run + 1)))
+                for k, n in enumerate(EMOMATCH_POOLS):
+                    rows[s, sess, run]['order'][k, :n] = rng.permutation(np.arange(1, n + 1))
+    rows['task'] = 'emomatch'
+    rows['subject'] = np.arange(N_SUBJECTS)[:, None, None]
+    rows['session'] = np.arange(1, N_SESSIONS + 1)[None, :, None]
+    rows['run'] = np.arange(1, N_RUNS + 1)[None, None, :]
+    rows['n_order'] = EMOMATCH_POOLS
+
+def build_schedule():
+    """The complete schedule table (all tasks, subjects, sessions, runs)."""
+    table = np.zeros(len(TASKS) * N_SUBJECTS * N_SESSIONS * N_RUNS, dtype=SCHEDULE_DTYPE)
+    for task in LOCALIZERS:
+        _build_localizer(table, task)
+    _build_emomatch(table)
+    return table
+
+def write_schedule(schedule_dir):
+    os.makedirs(schedule_dir, exist_ok=True)
+    path = os.path.join(schedule_dir, SCHEDULE_FILE)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, build_schedule())
+    os.replace(tmp_path, path)
+    with open(os.path.join(schedule_dir, 'schedule.json'), 'w', encoding='utf-8') as f:
+        json.dump({'spec_hash': spec_hash(), 'tasks': TASKS, 'n_subjects': N_SUBJECTS,
+                   'slot': '((task_index * n_subjects + subject) * 2 + session - 1) * 2 + run - 1'}, f, indent=2)
+    return path
+
+def open_schedule(schedule_dir):
+    """Memory-mapped schedule table, (re)built first if missing or out of date."""
+    path = os.path.join(schedule_dir, SCHEDULE_FILE)
+    if path not in _tables:
+        try:
+            with open(os.path.join(schedule_dir, 'schedule.json'), encoding='utf-8') as f:
+                current = json.load(f).get('spec_hash') == spec_hash()
+        except (OSError, ValueError):
+            current = False
+        if not current or not os.path.exists(path):
+            write_schedule(schedule_dir)
+        _tables[path] = np.load(path, mmap_mode='r')
+    return _tables[path]
+
+
+
+# ---------- emomatch trials ----------
+
+EMOMATCH_LEVELS = 21      # checkerboard levels, (3 * level + 18) % black
+EMOMATCH_EXEMPLARS = 10   # exemplars per checkerboard level
+EMOMATCH_MARGIN = (0.20, 0.40)  # allowed probe/foil difference in proportion black
+
+def trial_rng(subject, session, run):
+    """Generator for the probe/foil/target draws of one emomatch run."""
+    return np.random.default_rng(get_string_seed(str(subject) + str(session) + str(run) + 'trials'))
+
+def _pick_allowed(rng, allowed):
+    """One uniform draw per row among the True entries of ``allowed`` (last axis), as 1-based value."""
+    return np.where(allowed, rng.random(allowed.shape), -1.0).argmax(axis=-1) + 1
+
+def _balanced(rng, batch, n):
+    """Each row a shuffled set of n // 2 zeros and n - n // 2 ones."""
+    halves = np.r_[np.zeros(n // 2, dtype=int), np.ones(n - n // 2, dtype=int)]
+    return rng.permuted(np.tile(halves, (batch, 1)), axis=1)
+
+def _faces(rng, order, n_faces):
+    """Probe/foil/target identities: foil and target differ from the probe and each other."""
+    probe = np.where(order >= n_faces + 1, (order - n_faces + 1) % n_faces + 1, order).astype(int)
+    ids = np.arange(1, n_faces + 1)
+    foil = _pick_allowed(rng, ids != probe[..., None])
+    target = _pick_allowed(rng, (ids != probe[..., None]) & (ids != foil[..., None]))
+    return np.stack([probe, foil, target], axis=-1)
+
+def sample_emomatch_trials(rng, order_cb, order_gen, order_emo, n_faces=9, n_blocks=3):
+    """Probe/foil/target of every emomatch trial for a batch of runs, drawn at once.
+
+    ``order_*`` are (runs, trials) item orders, one row per run. Constraints are
+    applied by masking the allowed values, so no draw is ever repeated. Returns
+    arrays with the runs on the first axis; the foil location (0 left, 1 right)
+    is drawn per block and condition, as (runs, blocks, 3, trials).
+    """
+    order_cb = np.atleast_2d(order_cb).astype(int)
+    batch, n = order_cb.shape
+
+    # checkerboards: foil level within the margin of the probe level; target is the probe level
+    levels = np.arange(1, EMOMATCH_LEVELS + 1)
+    probe_black = (3 * order_cb + 18) / 100
+    level_black = (3 * levels + 18) / 100
+    diff = np.abs(probe_black[..., None] - level_black)
+    foil = _pick_allowed(rng, (diff >= EMOMATCH_MARGIN[0]) & (diff <= EMOMATCH_MARGIN[1]) & (diff != 0))
+    foil_black = (3 * foil + 18) / 100
+    # exemplars: foil and target exemplar differ from the probe exemplar (not necessarily from each other)
+    probe_ex = rng.integers(1, EMOMATCH_EXEMPLARS + 1, size=(batch, n))
+    other_ex = rng.integers(1, EMOMATCH_EXEMPLARS, size=(batch, n, 2))
+    other_ex += other_ex >= probe_ex[..., None]
+
+    out = {
+        'cb_items': np.stack([order_cb, foil, order_cb], axis=-1),
+        'cb_exemplars': np.concatenate([probe_ex[..., None], other_ex], axis=-1),
+        'perceptual_diff': np.abs(probe_black - foil_black),
+        'probe_prop_black': probe_black,
+        'foil_prop_black': foil_black,
+    }
+
+    # gender: foil has the other gender, target the probe's
+    order_gen = np.atleast_2d(order_gen)
+    out['gen_ids'] = _faces(rng, order_gen, n_faces)
+    probe_gender = _balanced(rng, batch, order_gen.shape[1])
+    out['gen_genders'] = np.stack([probe_gender, 1 - probe_gender, probe_gender], axis=-1)
+
+    # emotion: foil has the other emotion, target the probe's; foil/target gender balanced at random
+    order_emo = np.atleast_2d(order_emo)
+    n_emo = order_emo.shape[1]
+    out['emo_ids'] = _faces(rng, order_emo, n_faces)
+    out['emo_genders'] = np.stack([_balanced(rng, batch, n_emo) for _ in range(3)], axis=-1)
+    probe_emo = _balanced(rng, batch, n_emo)
+    out['emo_emos'] = np.stack([probe_emo, 1 - probe_emo, probe_emo], axis=-1)
+
+    locations = _balanced(rng, batch * n_blocks * 3, n)
+    out['foil_location'] = locations.reshape(batch, n_blocks, 3, n)
+    return out
+
+def check_emomatch_trials(schedule_dir, n_trials=6, seed=0):
+    """Sample the trials of every emomatch run in the schedule and print their balance."""
+    import time
+    table = open_schedule(schedule_dir)
+    rows = table[table['task'] == b'emomatch']
+    start = time.perf_counter()
+    trials = sample_emomatch_trials(np.random.default_rng(seed), rows['order'][:, 0, :n_trials],
+                                    rows['order'][:, 1, :n_trials], rows['order'][:, 2, :n_trials])
+    seconds = time.perf_counter() - start
+    print(f"emomatch: {len(rows)} runs sampled in {seconds * 1000:.1f} ms ({len(rows) / seconds:,.0f} runs/s)")
+    steps = np.rint(trials['perceptual_diff'] * 100 / 3).astype(int)
+    print("  checkerboard foil level distance: " + ", ".join(f"{d}: {c}" for d, c in zip(*np.unique(steps, return_counts=True))))
+    for key in ['gen_ids', 'emo_ids']:
+        counts = np.bincount(trials[key][..., 1:].ravel())[1:]
+        print(f"  {key[:3]} foil/target identity use: min {counts.min()} max {counts.max()}")
+    exemplars = np.bincount(trials['cb_exemplars'].ravel())[1:]
+    print(f"  checkerboard exemplar use: min {exemplars.min()} max {exemplars.max()}")
+    print(f"  target on the right: {1 - trials['foil_location'].mean():.3f}")
+    return trials
+
+# ---------- lookup ----------
+
+def load_run(schedule_dir, task, subject, session, run):
+    """Schedule of one run as plain Python values (one O(1) record lookup)."""
+    rec = open_schedule(schedule_dir)[slot(task, subject, session, run)]
+    n = int(rec['n_trials'])
+    n_order = [int(k) for k in rec['n_order']]
+    out = {
+        'design_label': rec['design_label'].decode(),
+        'flip': bool(rec['flip']),
+        'design': rec['condition'][:n].tolist(),
+        'items': rec['item'][:n].tolist(),
+        'stims': [s.decode() for s in rec['stim'][:n]],
+        'orders': [np.array(rec['order'][k, :n_order[k]], dtype=int) for k in range(3) if n_order[k]],
+        'blocks': rec['blocks'].tolist(),
+    }
+    # items of each condition in the order this run uses them
+    out['run_items'] = [[i for c, i in zip(out['design'], out['items']) if c == cond] for cond in (1, 2)]
+    return out
+
+def trial_table(schedule_dir):
+    """Flat per-trial table of the localizers (for offline balance checks)."""
+    table = open_schedule(schedule_dir)
+    rows = table[table['n_trials'] > 0]
+    trial = np.arange(MAX_TRIALS)
+    keep = trial[None, :] < rows['n_trials'][:, None]
+    n = keep.sum()
+    flat = np.zeros(n, dtype=[('task', 'S8'), ('subject', 'u2'), ('session', 'u1'), ('run', 'u1'), ('trial', 'u1'),
+                              ('design_label', 'S2'), ('condition', 'u1'), ('item', 'u1'), ('stim', 'S16')])
+    for name in ['task', 'subject', 'session', 'run', 'design_label']:
+        flat[name] = np.repeat(rows[name], rows['n_trials'])
+    flat['trial'] = np.broadcast_to(trial + 1, keep.shape)[keep]
+    for name in ['condition', 'item', 'stim']:
+        flat[name] = rows[name][keep]
+    return flat
+
+def check_balance(schedule_dir, subjects=range(1, 51)):
+    """Print item/design balance over ``subjects`` and verify against the reference helpers."""
+    flat = trial_table(schedule_dir)
+    flat = flat[np.isin(flat['subject'], list(subjects))]
+    for task in LOCALIZERS:
+        t = flat[flat['task'] == task.encode()]
+        print(f"{task}:")
+        for sess in (1, 2):
+            for cond in (1, 2):
+                x = t[(t['session'] == sess) & (t['condition'] == cond)]
+                counts = np.bincount(x['item'], minlength=LOCALIZERS[task]['n_items'] + 1)[1:]
+                print(f"  session {sess:02d} condition {cond}: item use min {counts.min()} max {counts.max()}")
+        for run in (1, 2):
+            labels, counts = np.unique(t[(t['run'] == run) & (t['trial'] == 1)]['design_label'], return_counts=True)
+            print(f"  run {run}: " + ", ".join(f"{l.decode()} x{c}" for l, c in zip(labels, counts)))
+    # spot check against the helpers the tasks used before
+    mismatches = 0
+    for task in LOCALIZERS:
+        for s in subjects:
+            subject = '{:03d}'.format(s)
+            for session in ('01', '02'):
+                orders = item_orders_for_subject(task, subject, session)
+                for run in (1, 2):
+                    rec = load_run(schedule_dir, task, subject, session, run)
+                    design, label, flip = pick_design_for_run(task, run, subject)
+                    items, stims = items_for_run(task, run, subject, session)
+                    same = (rec['design'] == list(design) and rec['design_label'] == label and rec['flip'] == flip
+                            and all(np.array_equal(a, b) for a, b in zip(rec['orders'], orders))
+                            and rec['items'] == items and rec['stims'] == stims)
+                    mismatches += not same
+    for s in subjects:
+        subject = '{:03d}'.format(s)
+        for session in ('01', '02'):
+            for run in (1, 2):
+                rec = load_run(schedule_dir, 'emomatch', subject, session, run)
+                same = (rec['blocks'][:3] == pick_design_for_subj(subject, 1, 3)
+                        and rec['blocks'][-3:] == pick_design_for_subj(subject, 2, 3)
+                        and all(np.array_equal(a, b) for a, b in zip(rec['orders'], emomatch_item_orders(subject, session, str(run)))))
+                mismatches += not same
+    print(f"reference check: {mismatches} mismatching runs")
+    return mismatches
+
+
+if __name__ == '__main__':
+    import sys
+    schedule_dir = paths().schedule_dir
+    print(f"schedule written to {write_schedule(schedule_dir)}")
+    if '--check' in sys.argv:
+        check_balance(schedule_dir)
+        check_emomatch_trials(schedule_dir)
@@ -0,0 +1,91 @@
+# session.py
+# Run several carousel tasks for one subject/session in a single process and window
+#
+# The window, fonts (PsychoPy keeps its font atlases per process), the video
+# index and the imported task modules are shared by all tasks of the queue.
+# Each task still writes its own log/CSV files; between tasks the operator
+# gets a prompt instead of a PsychoPy restart.
+
+import startup
+from psychopy import core, event, logging, visual
+from specs import localizer_spec_names
+import engine
+
+# task -> allowed values of its extra argument (run number or movie), None if it has none
+TASK_ARGS = {
+    'cross': None,
+    'movie': ['cloudy', 'lotr'],
+    'beliefs': ['1', '2'],
+    'social': ['1', '2'],
+    'emoinf': ['1', '2'],
+    'emomatch': ['1', '2'],
+}
+# localizers that only have a spec file (localizers/<task>.json) take a run number too
+TASK_ARGS.update({task: ['1', '2'] for task in localizer_spec_names() if task not in TASK_ARGS})
+DEFAULT_QUEUE = 'cross, movie:cloudy, beliefs:1, social:1, emoinf:1, emomatch:1'
+
+
+def parse_queue(text):
+    """'cross, movie:lotr, beliefs:1' -> [('cross', None), ('movie', 'lotr'), ('beliefs', '1')]"""
+    queue = []
+    for entry in text.replace(';', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        task, _, arg = entry.partition(':')
+        task, arg = task.strip(), arg.strip() or None
+        if task not in TASK_ARGS:
+            raise ValueError(f"Unknown task '{task}' in session queue")
+        allowed = TASK_ARGS[task]
+        if allowed is None and arg is not None:
+            raise ValueError(f"Task '{task}' takes no run/movie (got '{arg}')")
+        if allowed is not None and arg not in allowed:
+            raise ValueError(f"Task '{task}' needs one of {allowed} (e.g. {task}:{allowed[0]})")
+        queue.append((task, arg))
+    if not queue:
+        raise ValueError("Session queue is empty")
+    return queue
+
+def session_files(subject, session, language, demo, queue):
+    """Files every task of ``queue`` reads (for the preflight before the window opens)."""
+    paths = []
+    for task, arg in queue:
+        args = (subject, session, language, demo) if arg is None else (subject, session, language, demo, arg)
+        paths += engine.task_files(task)(*args)
+    return paths
+
+def run_session(subject, session, language, demo, queue):
+    """Run the (task, arg) entries of ``queue`` in order in one window."""
+    logging.console.setLevel(logging.ERROR)
+    win = visual.Window(fullscr=True, color='black', units='height')
+    win.mouseVisible = False
+    prompt = visual.TextStim(win, name='session prompt', text='', font=['Arial', 'Gill Sans MT', 'Helvetica', 'Verdana'],
+                             pos=(0, 0), height=float(.04), wrapWidth=1100, color='white')
+
+    done = []
+    try:
+        for task, arg in queue:
+            label = task if arg is None else f"{task} {arg}"
+            win.color = 'black'
+            prompt.setText(f"Next: {label}\n\nspace: start    escape: stop session")
+            prompt.draw()
+            win.flip()
+            if 'escape' in event.waitKeys(keyList=['space', 'escape']):
+                break
+
+            with startup.timed(task):
+                run_task = engine.task_runner(task)
+            args = (subject, session, language, demo) if arg is None else (subject, session, language, demo, arg)
+            taskStart = core.getTime()
+            run_task(*args, win=win)
+            done.append(label)
+            print(f"Finished {label} ({core.getTime() - taskStart:.1f} s)")
+    except KeyboardInterrupt:
+        print(f"Session stopped during {label}")
+    finally:
+        remaining = [t if a is None else f"{t}:{a}" for t, a in queue[len(done):]]
+        print("Completed: " + (", ".join(done) or "none"))
+        if remaining:
+            print("Not run: " + ", ".join(remaining))
+        win.close()
+    core.quit()
@@ -0,0 +1,365 @@
+# simulate.py
+# Headless simulation of carousel runs on a virtual clock
+#
+# Swaps in a virtual clock, a no-op window/stimuli and a simulated participant
+# (scripted key presses) and scanner (trigger pulses every TR), then calls a
+# task's run_task() as usual. A full run takes well under a second and writes
+# the same CSV/.log files as a real one, into a scratch io root whose
+# stimuli/instructions/schedule link to the real ones.
+#
+# usage:  python simulate.py "beliefs:1, social:1" --subjects 001-050 --session 01 --lang en
+
+import os
+import random
+import argparse
+import tempfile
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from psychopy import core, event, logging, visual
+from psychopy.hardware import keyboard
+from video_index import video_info
+from schedule import open_schedule
+import session as session_runner
+import engine
+import config
+
+FRAME_RATE = 60.0
+READ_TIME = 0.5          # s a simulated participant/operator takes on a waitKeys screen
+DEFAULT_CLIP_DUR = 20.0  # s, used when a clip is not in the video index
+
+
+class SimTime:
+    """The virtual time line every simulated object reads and advances."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds):
+        self.now += max(seconds, 0.0)
+
+    def flip(self, frame_dur):
+        self.now += frame_dur
+
+class RealTime:
+    """Wall-clock time line with a stub display that flips on a fixed vsync grid
+    (used by benchmark.py to measure timing under load)."""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+
+    @property
+    def now(self):
+        return time.perf_counter() - self._t0
+
+    def advance(self, seconds):
+        time.sleep(max(seconds, 0.0))
+
+    def flip(self, frame_dur):
+        # block until the next refresh, like a flip with vsync
+        deadline = (int(self.now / frame_dur) + 1) * frame_dur
+        if deadline - self.now > 0.002:
+            time.sleep(deadline - self.now - 0.002)
+        while self.now < deadline:
+            pass
+
+class SimClock:
+    """Stand-in for core.Clock on the virtual time line."""
+
+    def __init__(self):
+        self._timeAtLastReset = _sim.time.now
+
+    def getTime(self):
+        return _sim.time.now - self._timeAtLastReset
+
+    def reset(self, newT=0.0):
+        self._timeAtLastReset = _sim.time.now + newT
+
+    def getLastResetTime(self):
+        return self._timeAtLastReset
+
+    def addTime(self, t):
+        self._timeAtLastReset -= t
+
+class SimWindow:
+    """No-op window: flip() advances the virtual clock by one frame."""
+
+    monitorFramePeriod = 1.0 / FRAME_RATE
+
+    def __init__(self, *args, **kwargs):
+        self.color = kwargs.get('color')
+        self.units = kwargs.get('units')
+        self.size = (1920, 1080)
+        self.mouseVisible = True
+        self._toLog = []
+        self._toCall = []
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return FRAME_RATE
+
+    def logOnFlip(self, msg, level, obj=None):
+        self._toLog.append((msg, level))
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._toCall.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        _sim.time.flip(self.monitorFramePeriod)
+        for function, args, kwargs in self._toCall:
+            function(*args, **kwargs)
+        self._toCall = []
+        for msg, level in self._toLog:
+            logging.log(msg, level)
+        self._toLog = []
+        logging.flush()
+        return _sim.time.now
+
+    def clearBuffer(self):
+        pass
+
+    def close(self):
+        pass
+
+class SimStim:
+    """No-op stimulus that keeps whatever attributes the task sets."""
+
+    def __init__(self, win=None, *args, **kwargs):
+        self.win = win
+        self.autoLog = False
+        self.__dict__.update(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('set'):  # setText, setPos, ...
+            attr = name[3].lower() + name[4:]
+            return lambda value, *args, **kwargs: setattr(self, attr, value)
+        raise AttributeError(name)
+
+    def draw(self, win=None):
+        pass
+
+class SimMovieStim(SimStim):
+    """Movie that 'plays' for its indexed duration on the virtual clock."""
+
+    def __init__(self, win, filename, *args, **kwargs):
+        super().__init__(win, **kwargs)
+        self.filename = filename
+        try:
+            self.duration = video_info(filename)['duration']
+        except (OSError, ImportError, KeyError, ValueError):
+            self.duration = DEFAULT_CLIP_DUR
+        self._start = None
+
+    def play(self):
+        self._start = _sim.time.now
+
+    def stop(self):
+        self._start = None
+
+    pause = stop
+
+    def unload(self):
+        pass
+
+    @property
+    def isPlaying(self):
+        return self._start is not None and _sim.time.now - self._start < self.duration
+
+class SimKeyPress:
+    def __init__(self, name, rt):
+        self.name = name
+        self.rt = rt
+        self.tDown = rt
+
+class SimKeyboard:
+    """Stand-in for psychopy.hardware.keyboard.Keyboard fed by the simulated participant/scanner."""
+
+    def __init__(self, *args, clock=None, **kwargs):
+        self.clock = clock if clock is not None else SimClock()
+
+    def getKeys(self, keyList=None, waitRelease=False, clear=True):
+        now = _sim.time.now
+        participant = _sim.participant
+        participant.generate(now)
+        t0 = self.clock.getLastResetTime()
+        out = []
+        for key in (keyList if keyList is not None else list(participant.buffer)):
+            times = participant.buffer.get(key)
+            while times and times[0] <= now:
+                t = times.popleft()
+                # poll latency, for presses made while this key was being polled
+                last = participant.last_poll.get(key)
+                if last is not None and last <= t and now - last < 0.1:
+                    participant.latencies.append(now - t)
+                out.append(SimKeyPress(key, t - t0))
+            participant.last_poll[key] = now
+        out.sort(key=lambda k: k.rt)
+        return out
+
+    def clearEvents(self, eventType=None):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class SimParticipant:
+    """Scripted key presses: trigger pulses every TR after the trigger and
+    response keys at random times (about one every ``press_every`` s)."""
+
+    def __init__(self, seed=0, tr=2.0, responseKeys=('1', '2'), press_every=1.5, triggerKey='5'):
+        self.rng = random.Random(seed)
+        self.tr = tr
+        self.responseKeys = list(responseKeys)
+        self.press_every = press_every
+        self.triggerKey = triggerKey
+        self.buffer = {}
+        self.next_pulse = None
+        self.next_press = None
+        self.last_poll = {}  # key -> time it was last polled
+        self.latencies = []  # s from press to poll
+
+    def _add(self, key, t):
+        self.buffer.setdefault(key, deque()).append(t)
+
+    def trigger(self, t):
+        """Scanner starts at ``t`` (first pulse); responses start with it."""
+        self.buffer = {}
+        self.next_pulse = t
+        self.next_press = t + self.rng.expovariate(1.0 / self.press_every)
+        self.generate(t)
+
+    def generate(self, now):
+        if self.next_pulse is None:
+            return
+        while self.next_pulse <= now:
+            self._add(self.triggerKey, self.next_pulse)
+            self.next_pulse += self.tr
+        while self.next_press <= now:
+            self._add(self.rng.choice(self.responseKeys), self.next_press)
+            self.next_press += self.rng.expovariate(1.0 / self.press_every)
+
+class _Sim:
+    time = SimTime()
+    participant = SimParticipant()
+
+_sim = _Sim()
+
+
+def _waitKeys(maxWait=float('inf'), keyList=None, timeStamped=False, **kwargs):
+    _sim.time.advance(READ_TIME)
+    key = keyList[0] if keyList else 'space'
+    if key == _sim.participant.triggerKey:
+        _sim.participant.trigger(_sim.time.now)
+    return [key]
+
+def _getKeys(keyList=None, timeStamped=False, **kwargs):
+    return []  # the simulated participant never presses the break key
+
+def _clearEvents(eventType=None):
+    pass
+
+def _wait(secs, hogCPUperiod=0.2):
+    _sim.time.advance(secs)
+
+def _getTime(*args, **kwargs):
+    return _sim.time.now
+
+def _quit():
+    logging.flush()
+    raise SystemExit(0)
+
+PATCHES = [
+    (visual, 'Window', SimWindow),
+    (visual, 'TextStim', SimStim),
+    (visual, 'ImageStim', SimStim),
+    (visual, 'MovieStim', SimMovieStim),
+    (core, 'Clock', SimClock),
+    (core, 'getTime', _getTime),
+    (core, 'wait', _wait),
+    (core, 'quit', _quit),
+    (event, 'waitKeys', _waitKeys),
+    (event, 'getKeys', _getKeys),
+    (event, 'clearEvents', _clearEvents),
+    (keyboard, 'Keyboard', SimKeyboard),
+]
+
+@contextmanager
+def simulated(seed=0, tr=2.0, realtime=False):
+    """Patch psychopy with the virtual-clock stand-ins for the duration of the block.
+
+    With ``realtime`` the stand-ins run on the wall clock instead (stub renderer).
+    """
+    originals = [(module, name, getattr(module, name)) for module, name, _ in PATCHES]
+    _sim.time = RealTime() if realtime else SimTime()
+    _sim.participant = SimParticipant(seed=seed, tr=tr)
+    for module, name, replacement in PATCHES:
+        setattr(module, name, replacement)
+    try:
+        yield _sim
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+def scratch_io_root(io_root_dir, out_dir=None):
+    """io root for simulated runs: links to the real stimuli/instructions/schedule, its own logs."""
+    out_dir = out_dir or tempfile.mkdtemp(prefix='carousel_sim_')
+    os.makedirs(out_dir, exist_ok=True)
+    open_schedule(os.path.join(io_root_dir, config.SCHEDULE_DIR))  # build it once, runs share it through the link
+    for sub in ['stimuli', 'instructions', config.SCHEDULE_DIR]:
+        link = os.path.join(out_dir, sub)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(io_root_dir, sub), link, target_is_directory=True)
+    for log_sub, _ in config.task_dirs().values():
+        os.makedirs(os.path.join(out_dir, 'logs', log_sub), exist_ok=True)
+    return out_dir
+
+def simulate(task, subject, session, language, arg=None, demo='full', seed=0, tr=2.0, io_root_dir=None,
+             realtime=False):
+    """Run one task on the virtual clock; outputs go to ``io_root_dir``/logs.
+
+    Returns the simulated participant (its ``latencies`` are the key poll latencies).
+    """
+    run_task = engine.task_runner(task)
+    args = (subject, session, language, demo) if arg is None else (subject, session, language, demo, arg)
+    try:
+        with config.io_root(io_root_dir or config.paths().io_root_dir), simulated(seed=seed, tr=tr, realtime=realtime) as sim:
+            run_task(*args)
+    except SystemExit:
+        pass  # run_task ends with core.quit()
+    return sim.participant
+
+def parse_subjects(text):
+    """'001-003,010' -> ['001', '002', '003', '010']"""
+    subjects = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        if last:
+            subjects += ['{:03d}'.format(s) for s in range(int(first), int(last) + 1)]
+        elif first:
+            subjects.append(first)
+    return subjects
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate carousel runs on a virtual clock.")
+    parser.add_argument('queue', help="tasks as in session mode, e.g. 'cross, movie:cloudy, beliefs:1'")
+    parser.add_argument('--subjects', default='001', help="e.g. 001-050 or 001,002")
+    parser.add_argument('--session', default='01')
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--demo', action='store_true', help="simulate demo mode")
+    parser.add_argument('--tr', type=float, default=2.0)
+    parser.add_argument('--out', default=None, help="scratch io root (default: new temp dir)")
+    opts = parser.parse_args()
+
+    out_dir = scratch_io_root(config.paths().io_root_dir, opts.out)
+    logging.console.setLevel(logging.ERROR)
+
+    queue = session_runner.parse_queue(opts.queue)
+    for subject in parse_subjects(opts.subjects):
+        for task, arg in queue:
+            simulate(task, subject, opts.session, opts.lang, arg, demo='demo' if opts.demo else 'full',
+                     seed=int(subject), tr=opts.tr, io_root_dir=out_dir)
+    print(f"Simulated runs written to {os.path.join(out_dir, 'logs')}")
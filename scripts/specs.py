@@ -0,0 +1,19 @@
+# specs.py
+# Localizer spec files (scripts/localizers/<task>.json)
+#
+# The story/clip localizers run by engine.py are defined by one spec file per
+# task. Only uses the standard library, so config, schedule and manifest can
+# list and read the specs on a machine without psychopy.
+
+import json
+from pathlib import Path
+
+LOCALIZER_SPEC_DIR = Path(__file__).parent / 'localizers'
+
+def localizer_spec_names():
+    """Tasks with a localizer spec file (scripts/localizers/<task>.json)."""
+    return sorted(p.stem for p in LOCALIZER_SPEC_DIR.glob('*.json'))
+
+def load_localizer_spec(task):
+    with open(LOCALIZER_SPEC_DIR / f'{task}.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,71 @@
+# startup.py
+# Lazy imports and import timing for a fast start of main.py
+#
+# Only uses the standard library, so it can be imported before anything heavy.
+# lazy_import() returns a module that is executed on first attribute access;
+# both eager (timed) and lazy imports are recorded for the startup report.
+
+import sys
+import time
+import importlib.abc
+import importlib.util
+from contextlib import contextmanager
+
+_t0 = time.perf_counter()
+_records = []  # (label, seconds, how, seconds since start)
+
+
+def _record(label, seconds, how):
+    _records.append((label, seconds, how, time.perf_counter() - _t0))
+
+@contextmanager
+def timed(label):
+    """Time the imports (or anything else) in a ``with`` block."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(label, time.perf_counter() - start, 'eager')
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module's loader to time its execution (the actual import)."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        self.loader.exec_module(module)
+        _record(self.name, time.perf_counter() - start, 'first use')
+
+def lazy_import(name):
+    """Import ``name`` now, but only run its code the first time it is used."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    spec.loader = importlib.util.LazyLoader(_TimedLoader(name, spec.loader))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+def elapsed():
+    """Seconds since startup.py was first imported."""
+    return time.perf_counter() - _t0
+
+def report():
+    """Import cost per module, most expensive first."""
+    lines = ["Startup import times:"]
+    for label, seconds, how, at in sorted(_records, key=lambda r: -r[1]):
+        lines.append(f"  {seconds * 1000:8.1f} ms  {label} ({how}, done at {at:.2f} s)")
+    lines.append(f"  ({elapsed():.2f} s since start; nested imports are counted in their parent too)")
+    return "\n".join(lines)
@@ -0,0 +1,151 @@
+# textures.py
+# Packed texture archive for the emomatch images (stimuli/emomatch)
+#
+# The decoded pixels of every image below a stimulus folder are packed into one
+# uint8 array (textures.npy) with an index by file name (textures.json: offset,
+# mode, width, height, plus the source file's size and mtime). Runs memory-map
+# the archive and hand PsychoPy PIL images that are views on it, so no PNG is
+# opened or decoded at run start. Images whose size or mtime changed are
+# re-decoded when the archive is rebuilt; the others are copied from the old one.
+#
+# Build/refresh the archive up front with:  python textures.py
+
+import os
+import json
+import numpy as np
+from PIL import Image
+
+ARCHIVE_NAME = 'textures.npy'
+INDEX_NAME = 'textures.json'
+IMAGE_EXTENSIONS = ('.png',)
+ZERO_COPY_MODES = ('L', 'RGBA')  # modes PIL can wrap around a buffer without copying
+ARCHIVED_DIRS = (os.path.join('stimuli', 'emomatch'),)
+
+_archives = {}  # stim_dir -> TextureArchive, opened once per process
+
+
+class TextureArchive:
+    """Read-only view of a packed archive: ``image(path)`` gives a PIL image without decoding."""
+
+    def __init__(self, stim_dir, files, pixels):
+        self.stim_dir = stim_dir
+        self.files = files
+        self.pixels = pixels
+
+    def _entry(self, path):
+        return self.files.get(os.path.relpath(os.path.abspath(path), self.stim_dir).replace(os.sep, '/'))
+
+    def __contains__(self, path):
+        return self._entry(path) is not None
+
+    def __len__(self):
+        return len(self.files)
+
+    def nbytes(self, path):
+        entry = self._entry(path)
+        return entry['width'] * entry['height'] * len(entry['mode'])
+
+    def image(self, path):
+        entry = self._entry(path)
+        view = self.pixels[entry['offset']:entry['offset'] + self.nbytes(path)]
+        return Image.frombuffer(entry['mode'], (entry['width'], entry['height']), view, 'raw', entry['mode'], 0, 1)
+
+def _scan(stim_dir):
+    """relative path -> (size, mtime) of every image below ``stim_dir``."""
+    found, stack = {}, [stim_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    st = entry.stat()
+                    found[os.path.relpath(entry.path, stim_dir).replace(os.sep, '/')] = (st.st_size, st.st_mtime)
+    return found
+
+def _decode(path):
+    with Image.open(path) as im:
+        im = im.convert('RGBA') if im.mode not in ZERO_COPY_MODES else im.copy()
+    return im.mode, im.size, np.asarray(im).reshape(-1)
+
+def _read_index(stim_dir):
+    try:
+        with open(os.path.join(stim_dir, INDEX_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _is_current(index, stim_dir, found):
+    """Index matches the images on disk and the archive file it was written with."""
+    try:
+        st = os.stat(os.path.join(stim_dir, ARCHIVE_NAME))
+    except OSError:
+        return False
+    files = index.get('files', {})
+    return (index.get('archive') == [st.st_size, st.st_mtime] and files.keys() == found.keys()
+            and all((files[rel]['size'], files[rel]['mtime']) == found[rel] for rel in found))
+
+def build_archive(stim_dir):
+    """Pack the images below ``stim_dir``, decoding only new or changed ones; returns the index."""
+    stim_dir = os.path.abspath(stim_dir)
+    _archives.pop(stim_dir, None)
+    archive_path = os.path.join(stim_dir, ARCHIVE_NAME)
+    found = _scan(stim_dir)
+    old = _read_index(stim_dir)
+    if _is_current(old, stim_dir, found):
+        return old
+    old_files = old.get('files', {})
+    try:
+        old_pixels = np.load(archive_path, mmap_mode='r') if old_files else None
+    except (OSError, ValueError):
+        old_pixels = None
+
+    files, chunks, offset = {}, [], 0
+    for rel in sorted(found):
+        size, mtime = found[rel]
+        entry = old_files.get(rel)
+        if old_pixels is not None and entry and (entry['size'], entry['mtime']) == (size, mtime):
+            n = entry['width'] * entry['height'] * len(entry['mode'])
+            mode, (width, height), pixels = entry['mode'], (entry['width'], entry['height']), old_pixels[entry['offset']:entry['offset'] + n]
+        else:
+            mode, (width, height), pixels = _decode(os.path.join(stim_dir, rel))
+        files[rel] = {'size': size, 'mtime': mtime, 'mode': mode, 'width': width, 'height': height, 'offset': offset}
+        chunks.append(pixels)
+        offset += pixels.size
+
+    # write the pixels next to the old archive, then swap (the old map is closed first for Windows)
+    tmp_path = archive_path + '.tmp.npy'
+    packed = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(offset,))
+    for rel, pixels in zip(sorted(found), chunks):
+        packed[files[rel]['offset']:files[rel]['offset'] + pixels.size] = pixels
+    packed.flush()
+    del packed, chunks, old_pixels
+    os.replace(tmp_path, archive_path)
+    st = os.stat(archive_path)
+    index = {'archive': [st.st_size, st.st_mtime], 'files': files}
+    tmp_path = os.path.join(stim_dir, INDEX_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(stim_dir, INDEX_NAME))
+    return index
+
+def open_archive(stim_dir):
+    """Memory-mapped archive of ``stim_dir``, (re)built first if images were added or changed."""
+    stim_dir = os.path.abspath(stim_dir)
+    if stim_dir not in _archives:
+        index = _read_index(stim_dir)
+        if not _is_current(index, stim_dir, _scan(stim_dir)):
+            print(f"Texture archive of {stim_dir} is missing or out of date, packing the images...")
+            index = build_archive(stim_dir)
+        _archives[stim_dir] = TextureArchive(stim_dir, index['files'], np.load(os.path.join(stim_dir, ARCHIVE_NAME), mmap_mode='r'))
+    return _archives[stim_dir]
+
+
+if __name__ == '__main__':
+    from config import paths
+    io_root_dir = paths().io_root_dir
+    for sub_dir in ARCHIVED_DIRS:
+        stim_dir = os.path.join(io_root_dir, sub_dir)
+        if os.path.isdir(stim_dir):
+            index = build_archive(stim_dir)
+            print(f"{stim_dir}: {len(index['files'])} images packed ({os.path.getsize(os.path.join(stim_dir, ARCHIVE_NAME)) / 2**20:.1f} MB)")
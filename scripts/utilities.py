@@ -2,16 +2,23 @@
 # Utilities for social carousel 
 
 # import dependencies
-import sys
 import os
-import subprocess
 import time
-from psychopy import core, logging, visual, event
-from psychopy.visual import TextBox2
-import cv2
+import queue
+import threading
+from psychopy import core, logging
+from video_index import video_info
 import json
 import csv
 from pathlib import Path
+from startup import lazy_import
+
+# heavy dependencies load the first time a task uses them (not when main.py starts)
+visual = lazy_import('psychopy.visual')
+event = lazy_import('psychopy.event')
+keyboard = lazy_import('psychopy.hardware.keyboard')
+Image = lazy_import('PIL.Image')
+np = lazy_import('numpy')
 
 
 def define_keys(bk, tk, rk):
@@ -20,24 +27,556 @@ def define_keys(bk, tk, rk):
     responseKey = rk
     return{'break': breakKey, 'trigger': triggerKey, 'response': responseKey}
 
-def Trigger(clock, Txt, win, triggerKey):
+def Trigger(clock, Txt, win, triggerKey, events=None):
     Txt.setText('waiting for scanner...')
     Txt.draw()
     win.logOnFlip(level=logging.EXP, msg='DISPLAY waiting for trigger')
+    if events is not None:
+        events.on_flip(win, 'display', phase='trigger')
     win.flip()
     event.waitKeys(keyList=triggerKey)
     clock.reset()
 
+class FrameRecorder:
+    """Record every flip of a window and flag dropped frames per phase.
+
+    Wraps ``win.flip`` on the window instance, so every screen of a task is
+    measured without touching the draw code. Flip times go into a preallocated
+    array; an interval longer than (1 + tolerance) frame periods counts as a
+    dropped frame and is attributed to the phase shown by that flip.
+    """
+
+    def __init__(self, win, frame_dur, tolerance=0.5, max_frames=2**18):
+        self.win = win
+        self.frame_dur = frame_dur
+        self.tolerance = tolerance
+        self.times = np.zeros(max_frames)
+        self.codes = np.zeros(max_frames, dtype=np.int16)
+        self.labels = []
+        self._label_codes = {}
+        self.phase = 0
+        self.n = 0
+        self.overflow = 0
+        self.recording = False
+        self._flip = win.flip
+        win.flip = self._timed_flip
+
+    def set_phase(self, label):
+        if label not in self._label_codes:
+            self._label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        self.phase = self._label_codes[label]
+
+    def start(self):
+        self.n = 0
+        self.overflow = 0
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+
+    def detach(self):
+        """Give the window its own flip back (e.g. before the next task reuses it)."""
+        if self.win.flip == self._timed_flip:
+            self.win.flip = self._flip
+
+    def _timed_flip(self, *args, **kwargs):
+        result = self._flip(*args, **kwargs)
+        if self.recording:
+            if self.n < len(self.times):
+                self.times[self.n] = core.getTime()
+                self.codes[self.n] = self.phase
+                self.n += 1
+            else:
+                self.overflow += 1
+        return result
+
+    def summary(self, max_listed=100):
+        """Dropped-frame count, worst interval and per-phase percentiles (ms)."""
+        intervals = np.diff(self.times[:self.n]) * 1000
+        codes = self.codes[1:self.n]  # an interval belongs to the phase of the flip that ends it
+        dropped = np.flatnonzero(intervals > self.frame_dur * 1000 * (1 + self.tolerance))
+        out = {
+            'frame_dur_ms': round(self.frame_dur * 1000, 3),
+            'tolerance_frames': self.tolerance,
+            'frames': int(self.n),
+            'frames_not_recorded': int(self.overflow),
+            'dropped_frames': int(len(dropped)),
+            'worst_interval_ms': None,
+            'worst_interval_phase': None,
+            'phases': {},
+            'dropped': [],
+        }
+        if len(intervals):
+            worst = int(np.argmax(intervals))
+            out['worst_interval_ms'] = round(float(intervals[worst]), 3)
+            out['worst_interval_phase'] = self.labels[codes[worst]]
+        for code, label in enumerate(self.labels):
+            x = intervals[codes == code]
+            if not len(x):
+                continue
+            p50, p95, p99 = np.percentile(x, [50, 95, 99])
+            out['phases'][label] = {
+                'intervals': int(len(x)),
+                'dropped': int(np.count_nonzero(codes[dropped] == code)),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(x.max()), 3),
+            }
+        t0 = self.times[0] if self.n else 0.0
+        for i in dropped[:max_listed]:
+            out['dropped'].append({
+                'phase': self.labels[codes[i]],
+                't': round(float(self.times[i + 1] - t0), 4),
+                'interval_ms': round(float(intervals[i]), 3),
+            })
+        return out
+
+    def save(self, path: Path):
+        """Write the timing summary as JSON (e.g. next to the behavioural CSV)."""
+        self.stop()
+        self.detach()
+        summary = self.summary()
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        logging.exp('frame timing: {n} frames, {d} dropped, worst {w} ms'.format(
+            n=summary['frames'], d=summary['dropped_frames'], w=summary['worst_interval_ms']))
+        return summary
+
+class PulseRecorder:
+    """Timestamp every scanner pulse (trigger key) for the whole run.
+
+    Pulses come from a key source (times on the run clock) into a preallocated
+    buffer. A pulse arriving more than 1.5 TR or less than 0.5 TR after the
+    previous one is logged as a missed or doubled trigger right away. With a
+    nominal TR the drift of the stimulus PC clock against the scanner is
+    estimated from a line fit of pulse times over volume numbers.
+    """
+
+    def __init__(self, source, triggerKey, nominal_tr=None, max_pulses=4096):
+        self.source = source
+        self.triggerKey = list(triggerKey)
+        self.nominal_tr = nominal_tr
+        self.times = np.zeros(max_pulses)
+        self.flags = [''] * max_pulses
+        self.n = 0
+
+    def start(self, window=0.5):
+        """Call right after Trigger(): keeps the trigger pulse, drops older presses."""
+        self.n = 0
+        for key, t in self.source.getKeys(self.triggerKey):
+            if t >= -window:
+                self._add(t)
+
+    def poll(self):
+        for key, t in self.source.getKeys(self.triggerKey):
+            self._add(t)
+
+    def _add(self, t):
+        if self.n >= len(self.times):
+            return
+        self.times[self.n] = t
+        if self.n > 0:
+            tr = self.nominal_tr or self.tr_estimate()
+            interval = t - self.times[self.n - 1]
+            if tr and interval > 1.5 * tr:
+                self.flags[self.n] = 'missed'
+                logging.warning('pulse {n} at {t:.4f}: {i:.3f} s since last pulse, missed trigger?'.format(n=self.n, t=t, i=interval))
+            elif tr and interval < 0.5 * tr:
+                self.flags[self.n] = 'doubled'
+                logging.warning('pulse {n} at {t:.4f}: {i:.3f} s since last pulse, doubled trigger?'.format(n=self.n, t=t, i=interval))
+        self.n += 1
+
+    def tr_estimate(self):
+        """Median pulse interval so far (None before the second pulse)."""
+        if self.n < 2:
+            return None
+        return float(np.median(np.diff(self.times[:self.n])))
+
+    def volumes(self):
+        """Volume number of each pulse, counting missed ones."""
+        tr = self.nominal_tr or self.tr_estimate()
+        if not tr:
+            return np.zeros(self.n, dtype=int)
+        return np.rint((self.times[:self.n] - self.times[0]) / tr).astype(int)
+
+    def drift(self):
+        """Stimulus PC clock drift against the scanner in ppm (needs a nominal TR)."""
+        if not self.nominal_tr or self.n < 3:
+            return None
+        keep = np.array([f != 'doubled' for f in self.flags[:self.n]])
+        slope = np.polyfit(self.volumes()[keep], self.times[:self.n][keep], 1)[0]
+        return float((slope - self.nominal_tr) / self.nominal_tr * 1e6)
+
+    def save(self, path: Path):
+        """Write one row per pulse to a TSV sidecar and log the TR/drift estimate."""
+        self.poll()
+        volumes = self.volumes()
+        with path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f, delimiter='\t')
+            w.writerow(["pulse", "volume", "onset", "interval", "flag"])
+            for i in range(self.n):
+                interval = f"{self.times[i] - self.times[i - 1]:.4f}" if i else "n/a"
+                w.writerow([i, volumes[i], f"{self.times[i]:.4f}", interval, self.flags[i] or "ok"])
+        tr, drift = self.tr_estimate(), self.drift()
+        logging.exp('pulses: {n} recorded, TR {tr} s, drift {d} ppm, {m} missed, {x} doubled'.format(
+            n=self.n, tr='n/a' if tr is None else f"{tr:.4f}", d='n/a' if drift is None else f"{drift:.1f}",
+            m=self.flags.count('missed'), x=self.flags.count('doubled')))
+
+class PhaseScheduler:
+    """Present a run's phases on the frame closest to their planned onsets.
+
+    Planned onsets are seconds from the trigger (``clock`` is reset at the
+    trigger). Each phase starts where the previous one was planned to end, so
+    timing errors do not add up over the run. Phases without a duration (e.g. a
+    movie that plays until it is done) re-anchor the plan to their actual end.
+    """
+
+    def __init__(self, win, clock, frame_dur=None):
+        self.win = win
+        self.clock = clock
+        if frame_dur is None:
+            rate = win.getActualFrameRate()
+            frame_dur = 1.0 / rate if rate else win.monitorFramePeriod
+        self.frame_dur = frame_dur
+        self.next_onset = 0.0
+        self.records = []
+        self._off_msg = None
+        self._off_event = None
+        self._stims = ()  # stims of the last phase, redrawn while holding for a later onset
+        self.events = None  # EventStream getting a display/off event with every DISPLAY/OFF message
+        self.frames = FrameRecorder(win, frame_dur)
+        self.pollers = []  # input polled once per frame (e.g. PulseRecorder.poll)
+
+    def to_frames(self, seconds):
+        return int(round(seconds / self.frame_dur))
+
+    def log_pending(self):
+        """Log the last phase's OFF message on the next (manual) flip."""
+        if self._off_msg:
+            self.win.logOnFlip(level=logging.EXP, msg=self._off_msg)
+            self._off_msg = None
+        if self._off_event is not None:
+            self.events.on_flip(self.win, 'off', **self._off_event)
+            self._off_event = None
+
+    def run_phase(self, label, stims=(), duration=None, frames=None, onset=None,
+                  msg=None, off_msg=None, on_start=None, on_frame=None, until=None, fields=None):
+        """Show ``stims`` from ``onset`` for ``duration`` s (or ``frames``); return the actual onset.
+
+        Without ``onset`` the phase starts where the previous one was planned to
+        end; with a later ``onset`` the last phase's stims stay on screen until
+        the flip closest to it. on_start(onset) runs once after the first flip,
+        on_frame() after every flip, and the phase ends early once until()
+        returns False. ``fields`` (trial, condition, item, or a phase name other
+        than ``label``) go into the phase's display/off events.
+        """
+        planned = self.next_onset if onset is None else onset
+        if frames is not None:
+            duration = frames * self.frame_dur
+        end = None if duration is None else planned + duration
+
+        if not self.frames.recording:
+            self.frames.start()
+        if onset is not None:
+            self.hold(onset)
+        self.frames.set_phase(label)
+
+        # first frame of the phase, on the flip closest to the planned onset
+        for stim in stims:
+            stim.draw()
+        self.log_pending()
+        if msg:
+            self.win.logOnFlip(level=logging.EXP, msg=msg)
+        fields = dict({'phase': label}, **(fields or {}))
+        if self.events is not None and msg:
+            self.events.on_flip(self.win, 'display', **fields)
+        self.win.flip()
+        actual = last = self.clock.getTime()
+        n_frames = 1
+        self._off_msg = off_msg
+        if self.events is not None and off_msg:
+            self._off_event = fields
+        if on_start is not None:
+            on_start(actual)
+
+        while True:
+            for poll in self.pollers:
+                poll()
+            if on_frame is not None:
+                on_frame()
+            if until is not None and not until():
+                break
+            # stop when the next flip would land closer to the next phase's onset
+            if end is not None and last + 1.5 * self.frame_dur >= end:
+                break
+            for stim in stims:
+                stim.draw()
+            self.win.flip()
+            last = self.clock.getTime()
+            n_frames += 1
+
+        self.next_onset = end if end is not None else last + self.frame_dur
+        self._stims = stims
+        self.records.append({'phase': label, 'planned': planned, 'actual': actual, 'frames': n_frames})
+        return actual
+
+    def hold(self, onset):
+        """Keep flipping the current screen until the next flip lands closest to ``onset``."""
+        while self.clock.getTime() + 1.5 * self.frame_dur < onset:
+            for poll in self.pollers:
+                poll()
+            for stim in self._stims:
+                stim.draw()
+            self.win.flip()
+
+    def save(self, path: Path):
+        """Write planned vs. actual onset for every phase to a CSV file."""
+        with path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["phase", "planned_onset_s", "actual_onset_s", "onset_error_ms", "frames"])
+            for r in self.records:
+                w.writerow([
+                    r['phase'], f"{r['planned']:.4f}", f"{r['actual']:.4f}",
+                    f"{(r['actual'] - r['planned']) * 1000:.1f}", r['frames']
+                ])
+
+class KeyboardSource:
+    """Key presses from psychopy.hardware.keyboard, timestamped when they happened.
+
+    The keyboard backend (psychtoolbox) collects presses in the background, so
+    a press keeps its own time on ``clock`` however late it is polled.
+    """
+
+    def __init__(self, clock):
+        self.kb = keyboard.Keyboard(clock=clock)
+
+    def getKeys(self, keyList):
+        """Presses since the last call as (key, time on clock)."""
+        return [(k.name, k.rt) for k in self.kb.getKeys(keyList=keyList, waitRelease=False)]
+
+class SimulatedKeySource:
+    """Scripted key presses for testing without a keyboard.
+
+    ``presses`` is a list of (time on clock, key); each is returned once the
+    clock has passed its time, with that scripted time as its timestamp.
+    """
+
+    def __init__(self, clock, presses=()):
+        self.clock = clock
+        self.pending = sorted(presses)
+
+    def press(self, t, key):
+        self.pending.append((t, key))
+        self.pending.sort()
+
+    def getKeys(self, keyList):
+        now = self.clock.getTime()
+        due = [(t, key) for t, key in self.pending if t <= now and key in keyList]
+        for p in due:
+            self.pending.remove(p)
+        return [(key, t) for t, key in due]
+
+class ResponseBox:
+    """First response since a trial's onset (break key aborts the run).
+
+    poll() drains the key source without blocking and is called every frame of
+    a response window; the RT comes from the press timestamp, not the poll.
+    """
+
+    def __init__(self, responseKey, breakKey, source, events=None):
+        # only the first two response keys are scored (1/2), as before
+        self.codes = {responseKey[0]: 1, responseKey[1]: 2}
+        self.breakKey = breakKey
+        self.keyList = list(responseKey) + list(breakKey)
+        self.source = source
+        self.events = events  # EventStream getting a key event per press
+        self.start(0.0)
+
+    def start(self, onset, **fields):
+        """Open a response window at ``onset``; ``fields`` (trial, ...) go into the scored press's key event."""
+        self.onset = onset
+        self.fields = fields
+        self.key = 0
+        self.rt = 0.0
+
+    def poll(self):
+        for key, t in self.source.getKeys(self.keyList):
+            if key in self.breakKey:
+                raise KeyboardInterrupt
+            # presses left in the buffer from before the window opened don't count
+            scored = self.key == 0 and key in self.codes and t >= self.onset
+            if scored:
+                self.key = self.codes[key]
+                self.rt = t - self.onset
+            if self.events is not None:
+                if scored:
+                    self.events.emit(t, 'key', key=key, rt=self.rt, **self.fields)
+                else:
+                    self.events.emit(t, 'key', key=key)
+
+def close_task(win, logFile, own_win=True, aborted=False, events=None):
+    """End a task: close the window and quit, or hand the window back to a session.
+
+    In a session the task's log file is detached so the next task logs to its
+    own file, and an aborted task raises KeyboardInterrupt to stop the queue.
+    The run's event stream (if any) is flushed and closed first.
+    """
+    event.clearEvents()
+    if events is not None:
+        events.close()
+    logging.flush()
+    logging.root.removeTarget(logFile)
+    if own_win:
+        win.close()
+        core.quit()
+    if aborted:
+        raise KeyboardInterrupt
+
 def getDimensions(clip):
-    vid = cv2.VideoCapture(clip)
-    height = vid.get(cv2.CAP_PROP_FRAME_HEIGHT)
-    width = vid.get(cv2.CAP_PROP_FRAME_WIDTH)
-    return(width, height)
+    info = video_info(clip)
+    return(info['width'], info['height'])
+
+class ClipPrefetcher:
+    """Open the next clip while a static screen (e.g. fixation) is showing.
+
+    A background thread probes the clip's dimensions and reads the file once so
+    it is in the OS file cache. The MovieStim itself (decoder start-up and
+    textures) must be created on the render thread: poll() does that on the
+    first frame after the probe finished, where a static screen hides the cost.
+    """
+
+    def __init__(self, win, targetWidth=1024):
+        self.win = win
+        self.targetWidth = targetWidth
+        self.thread = None
+        self.error = None
+        self.movie = None
+
+    def start(self, clip, name):
+        self.clip = clip
+        self.name = name
+        self.dims = None
+        self.movie = None
+        self.error = None
+        self.thread = threading.Thread(target=self._probe, name='clip-prefetch', daemon=True)
+        self.thread.start()
+
+    def _probe(self):
+        # an error (e.g. a clip missing from the video index) is raised by take()
+        try:
+            self.dims = getDimensions(self.clip)
+            with open(self.clip, 'rb') as f:
+                while f.read(1 << 20):
+                    pass
+        except Exception as e:
+            self.error = e
+
+    def _build(self):
+        width, height = self.dims
+        targetHeight = round(self.targetWidth / (width / height))
+        self.movie = visual.MovieStim(self.win, self.clip, loop=False, noAudio=False,
+            name=self.name, size=(self.targetWidth, targetHeight))
+
+    def poll(self):
+        """Call once per frame; builds the MovieStim as soon as the probe is done."""
+        if (self.movie is None and self.thread is not None and not self.thread.is_alive()
+                and self.error is None):
+            self._build()
+
+    def take(self):
+        """Return the prepared MovieStim (building it now if the probe was late)."""
+        if self.thread is None:
+            raise RuntimeError("ClipPrefetcher.take() called before start()")
+        self.thread.join()
+        if self.error is not None:
+            error, self.error, self.thread = self.error, None, None
+            raise error
+        if self.movie is None:
+            self._build()
+        movie, self.movie, self.thread = self.movie, None, None
+        return movie
+
+class ImageStimCache:
+    """ImageStims built once per run, keyed by file path so repeated files share a texture.
+
+    With a packed ``archive`` (textures.open_archive) the pixels come from the
+    memory-mapped archive instead of decoding the image file.
+    """
+
+    def __init__(self, window, size, archive=None):
+        self.window = window
+        self.size = size
+        self.archive = archive
+        self.stims = {}
+        self.nbytes = 0
+        self.load_time = 0.0
+
+    def get(self, path):
+        # build (decode + texture upload) on first request, look up afterwards
+        path = os.path.abspath(path)
+        if path not in self.stims:
+            t0 = time.perf_counter()
+            if self.archive is not None and path in self.archive:
+                image = self.archive.image(path)
+            else:
+                image = Image.open(path)
+                image.load()  # decode once here; also closes the file
+            self.stims[path] = visual.ImageStim(
+                self.window,
+                image=image,
+                size=self.size,
+                interpolate=True,
+                autoLog=False
+            )
+            # textures are uploaded as RGBA, 1 byte per channel
+            width, height = image.size
+            self.nbytes += width * height * 4
+            self.load_time += time.perf_counter() - t0
+        return self.stims[path]
+
+    def __len__(self):
+        return len(self.stims)
+
+    def report(self):
+        return 'image cache: {n} textures, {mb:.1f} MB, loaded in {s:.2f} s'.format(
+            n=len(self.stims), mb=self.nbytes / 2**20, s=self.load_time)
+
+class TextStimCache:
+    """TextStims read from disk and laid out once before the trigger, keyed by file path.
+
+    ``style`` holds the TextStim keyword arguments shared by every screen
+    (font, height, wrapWidth, color, ...). Layout time is logged per screen.
+    """
+
+    def __init__(self, window, **style):
+        self.window = window
+        self.style = style
+        self.stims = {}
+        self.layout_time = 0.0
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        if path not in self.stims:
+            t0 = time.perf_counter()
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            # setting the text at construction does the full layout now
+            self.stims[path] = visual.TextStim(self.window, text=text,
+                name=os.path.basename(path), **self.style)
+            dt = time.perf_counter() - t0
+            self.layout_time += dt
+            logging.exp('text cache: {name} laid out in {ms:.1f} ms'.format(
+                name=os.path.basename(path), ms=dt * 1000))
+        return self.stims[path]
+
+    def __len__(self):
+        return len(self.stims)
 
-def getConfig(filename):
-    with open(filename, 'r') as f:
-        config = json.load(f)
-    return(config)
+    def report(self):
+        return 'text cache: {n} screens, laid out in {s:.2f} s'.format(
+            n=len(self.stims), s=self.layout_time)
 
 def is_valid_subject_id(subj_id):
     if len(subj_id) != 3:
@@ -47,6 +586,62 @@ def is_valid_subject_id(subj_id):
     return True
 
 # ---------- CSV writers ----------
+LOCALIZER_CSV_HEADER = [
+    "trial",
+    "design(1=belief,2=photo)",
+    "itemNum",
+    "key(1/2)",
+    "RT(s)",
+    "fix_onset_s",
+    "story_onset_s",
+    "stimulus_duration_s",
+    "question_onset_s"
+]
+
+EMOMATCH_CSV_HEADER = [
+    "trial",
+    "condition(0=checker,1=gender,2=emo)",
+    "condTrialNumber",
+    "probeFileName",
+    "foilFileName",
+    "targetFileName",
+    "perceptual_diff_cb",
+    "probePropBlack_cb",
+    "foilPropBlack_cb",
+    "blockOnsetTime",
+    "trialOnsetTime",
+    "targetLocation",
+    "keyPress",
+    "accuracy",
+    "RT(s)"
+]
+
+def localizer_csv_row(t, design, items, key_vec, RT_vec,
+                      fix_onsets, story_onsets, stimulus_duration, question_onsets):
+    """Formatted CSV row for trial index t of a story/clip localizer."""
+    return [
+        t + 1, design[t], items[t],
+        key_vec[t], f"{RT_vec[t]:.4f}",
+        f"{fix_onsets[t]:.3f}",
+        f"{story_onsets[t]:.3f}",
+        f"{stimulus_duration[t]:.3f}",
+        f"{question_onsets[t]:.3f}"
+    ]
+
+def emomatch_csv_row(t, cond, trialNum,
+            probeName, foilName, targetName, percepDiff,
+            probePropBlack, foilPropBlack,
+            block_onsets, trial_onsets, targetLocation,
+            key_vec, acc_vec, RT_vec):
+    """Formatted CSV row for trial index t of emomatch."""
+    return [
+        t + 1, cond[t], trialNum[t],
+        probeName[t], foilName[t], targetName[t], 
+        f"{percepDiff[t]:.4f}", f"{probePropBlack[t]:.4f}", f"{foilPropBlack[t]:.4f}", 
+        f"{block_onsets[t]:.4f}", f"{trial_onsets[t]:.4f}", 
+        targetLocation[t], key_vec[t], acc_vec[t], f"{RT_vec[t]:.4f}"
+    ]
+
 def save_csv(path: Path, design, items, key_vec, RT_vec,
              fix_onsets, story_onsets, stimulus_duration, question_onsets,
              *, experiment_duration=None, ips=None, meta=None):
@@ -54,26 +649,10 @@ def save_csv(path: Path, design, items, key_vec, RT_vec,
     trials_per_run = len(design)
     with path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow([
-            "trial",
-            "design(1=belief,2=photo)",
-            "itemNum",
-            "key(1/2)",
-            "RT(s)",
-            "fix_onset_s",
-            "story_onset_s",
-            "stimulus_duration_s",
-            "question_onset_s"
-        ])
+        w.writerow(LOCALIZER_CSV_HEADER)
         for t in range(trials_per_run):
-            w.writerow([
-                t + 1, design[t], items[t],
-                key_vec[t], f"{RT_vec[t]:.4f}",
-                f"{fix_onsets[t]:.3f}",
-                f"{story_onsets[t]:.3f}",
-                f"{stimulus_duration[t]:.3f}",
-                f"{question_onsets[t]:.3f}"
-            ])
+            w.writerow(localizer_csv_row(t, design, items, key_vec, RT_vec,
+                fix_onsets, story_onsets, stimulus_duration, question_onsets))
         # metadata block (empty line + key/value rows)
         if any(v is not None for v in (experiment_duration, ips, meta)):
             w.writerow([])
@@ -95,28 +674,112 @@ def save_csv_emomatch_behav(path: Path, cond, trialNum,
     totalTrials = len(cond)
     with path.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow([
-            "trial",
-            "condition(0=checker,1=gender,2=emo)",
-            "condTrialNumber",
-            "probeFileName",
-            "foilFileName",
-            "targetFileName",
-            "perceptual_diff_cb",
-            "probePropBlack_cb",
-            "foilPropBlack_cb",
-            "blockOnsetTime",
-            "trialOnsetTime",
-            "targetLocation",
-            "keyPress",
-            "accuracy",
-            "RT(s)"
-        ])
+        w.writerow(EMOMATCH_CSV_HEADER)
         for t in range(totalTrials):
-            w.writerow([
-                t + 1, cond[t], trialNum[t],
-                probeName[t], foilName[t], targetName[t], 
-                f"{percepDiff[t]:.4f}", f"{probePropBlack[t]:.4f}", f"{foilPropBlack[t]:.4f}", 
-                f"{block_onsets[t]:.4f}", f"{trial_onsets[t]:.4f}", 
-                targetLocation[t], key_vec[t], acc_vec[t], f"{RT_vec[t]:.4f}"
-            ])
\ No newline at end of file
+            w.writerow(emomatch_csv_row(t, cond, trialNum,
+                probeName, foilName, targetName, percepDiff,
+                probePropBlack, foilPropBlack,
+                block_onsets, trial_onsets, targetLocation,
+                key_vec, acc_vec, RT_vec))
+
+class EventStream:
+    """Typed events of a run, one JSON object per line, written from a background thread.
+
+    Next to every DISPLAY/OFF message of the text log there is a 'display' or
+    'off' event with the same flip time, the phase and, within trials, the
+    trial index, condition and item; every response key press is a 'key'
+    event (with its rt and trial when it was the scored response). Fields
+    that don't apply are left out. The render thread only puts tuples on a
+    queue; encoding and writing happen on the writer thread.
+    """
+
+    def __init__(self, path: Path, clock):
+        self.path = path
+        self.clock = clock
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+        self.thread.start()
+
+    def emit(self, t, event, **fields):
+        self.queue.put((t, event, fields))
+
+    def on_flip(self, win, event, **fields):
+        """Emit ``event`` at the time of the window's next flip."""
+        win.callOnFlip(lambda: self.emit(self.clock.getTime(), event, **fields))
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        with self.path.open("w", encoding="utf-8") as f:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                t, event, fields = item
+                record = {'t': round(t, 6), 'event': event}
+                record.update((k, v) for k, v in fields.items() if v is not None)
+                if 'rt' in record:
+                    record['rt'] = round(record['rt'], 6)
+                f.write(json.dumps(record, default=lambda v: v.item()) + '\n')  # numpy scalars
+                if self.queue.empty():
+                    f.flush()
+
+class BackupWriter:
+    """Append one backup CSV row per trial from a background thread.
+
+    The render thread only puts rows on a queue; the writer thread appends
+    them and fsyncs every ``fsync_every`` rows (0 = only when closing), so a
+    disk stall on the stimulus PC never delays the next flip.
+    """
+
+    def __init__(self, path: Path, header, fsync_every=1):
+        self.path = path
+        self.header = header
+        self.fsync_every = fsync_every
+        self.queue = queue.Queue()
+        self.error = None  # set by the writer thread if writing fails; raised by write()/close()
+        self.thread = threading.Thread(target=self._run, name='backup-writer', daemon=True)
+        self.thread.start()
+
+    def write(self, row):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(row)
+
+    def close(self, check=True):
+        """Flush everything queued so far and stop the writer thread.
+
+        A write error of the thread is raised here unless ``check`` is False
+        (an abort still saves its partial data; the error is logged either way).
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if check and self.error is not None:
+            raise self.error
+
+    def _run(self):
+        try:
+            self._write_rows()
+        except Exception as e:
+            logging.error('backup writer failed on {p}: {e}'.format(p=self.path, e=e))
+            self.error = e
+
+    def _write_rows(self):
+        with self.path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(self.header)
+            f.flush()
+            n_rows = 0
+            while True:
+                row = self.queue.get()
+                if row is None:
+                    break
+                w.writerow(row)
+                f.flush()
+                n_rows += 1
+                if self.fsync_every and n_rows % self.fsync_every == 0:
+                    os.fsync(f.fileno())
+            os.fsync(f.fileno())
@@ -0,0 +1,125 @@
+# video_index.py
+# Video metadata index for the stimulus folders (stimuli/social, stimuli/movies)
+#
+# Each folder gets a video_index.json next to the clips with width, height,
+# frame rate, frame count, duration and audio presence per file. Entries are
+# only re-probed when a file's size or mtime changed, so tasks can read clip
+# dimensions and durations without opening the videos.
+#
+# Build/refresh the index up front with:  python video_index.py
+
+import os
+import json
+import shutil
+import subprocess
+
+INDEX_NAME = 'video_index.json'
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.mov', '.mkv')
+INDEXED_DIRS = (os.path.join('stimuli', 'social'), os.path.join('stimuli', 'movies'))
+
+_indexes = {}  # stim_dir -> index, built once per process
+
+
+def _fraction(value):
+    num, _, den = str(value).partition('/')
+    try:
+        return float(num) / float(den) if den else float(num)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def _probe_ffprobe(path):
+    out = subprocess.run(
+        ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path],
+        capture_output=True, text=True, check=True).stdout
+    info = json.loads(out)
+    streams = info.get('streams', [])
+    video = next(s for s in streams if s.get('codec_type') == 'video')
+    fps = _fraction(video.get('avg_frame_rate')) or _fraction(video.get('r_frame_rate'))
+    duration = float(info.get('format', {}).get('duration') or video.get('duration') or 0.0)
+    frame_count = int(video['nb_frames']) if video.get('nb_frames') else int(round(duration * fps))
+    return {
+        'width': int(video['width']),
+        'height': int(video['height']),
+        'fps': fps,
+        'frame_count': frame_count,
+        'duration': duration,
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams),
+    }
+
+def _probe_cv2(path):
+    import cv2  # only needed when ffprobe is not available
+    vid = cv2.VideoCapture(path)
+    try:
+        fps = vid.get(cv2.CAP_PROP_FPS)
+        frame_count = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            'width': int(vid.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(vid.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration': frame_count / fps if fps else 0.0,
+            'has_audio': None,  # OpenCV does not read audio streams
+        }
+    finally:
+        vid.release()
+
+def probe_video(path):
+    """Read a clip's metadata with ffprobe, falling back to OpenCV."""
+    if shutil.which('ffprobe'):
+        try:
+            return _probe_ffprobe(path)
+        except (subprocess.CalledProcessError, StopIteration, KeyError, ValueError):
+            pass
+    return _probe_cv2(path)
+
+def build_index(stim_dir):
+    """Return the index for ``stim_dir``, re-probing only new or changed files."""
+    index_path = os.path.join(stim_dir, INDEX_NAME)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+
+    index = {}
+    for name in sorted(os.listdir(stim_dir)):
+        if not name.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+        st = os.stat(os.path.join(stim_dir, name))
+        entry = old.get(name)
+        if entry and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime:
+            index[name] = entry
+            continue
+        index[name] = {'size': st.st_size, 'mtime': st.st_mtime, **probe_video(os.path.join(stim_dir, name))}
+
+    if index != old:
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, index_path)
+    return index
+
+def load_index(stim_dir):
+    """Index for ``stim_dir``, checked against the files once per process."""
+    stim_dir = os.path.abspath(stim_dir)
+    if stim_dir not in _indexes:
+        _indexes[stim_dir] = build_index(stim_dir)
+    return _indexes[stim_dir]
+
+def video_info(clip):
+    """Metadata entry for a single clip."""
+    stim_dir, name = os.path.split(os.path.abspath(clip))
+    index = load_index(stim_dir)
+    if name not in index:  # added after the index was loaded
+        _indexes.pop(stim_dir)
+        index = load_index(stim_dir)
+    return index[name]
+
+
+if __name__ == '__main__':
+    from config import paths
+    io_root_dir = paths().io_root_dir
+    for sub_dir in INDEXED_DIRS:
+        stim_dir = os.path.join(io_root_dir, sub_dir)
+        if os.path.isdir(stim_dir):
+            print(f"{stim_dir}: {len(build_index(stim_dir))} videos indexed")